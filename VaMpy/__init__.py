@@ -1 +1,3 @@
-__all__ = ['lax_wendroff', 'utils', 'artery_network']
\ No newline at end of file
+__version__ = '0.0.0'
+
+__all__ = ['lax_wendroff', 'utils', 'artery_network', 'progress', 'reductions', 'probes', 'compare', 'warm_start', 'result_cache', 'refinement', 'parareal', 'job_server', 'frequency_domain', 'muscl_hancock', 'shooting', 'units', 'distributed', 'planner', 'work_precision', 'examples']
@@ -2,6 +2,7 @@
 
 from __future__ import division
 
+import os
 import numpy as np
 import sys
 import matplotlib.pylab as plt
@@ -9,6 +10,8 @@ import matplotlib.pylab as plt
 from mpl_toolkits.mplot3d import Axes3D
 from matplotlib import cm
 
+from units import ScaledView, scale
+
 
 class Artery(object):
     """
@@ -18,6 +21,8 @@ class Artery(object):
         
     def __init__(self, pos, R, lam, rho, nu, delta, **kwargs):
         self._pos = pos
+        self._R = R
+        self._k = kwargs['k']
         self._A0 = np.pi*R*R
         self._L = R[0]*lam
         k = kwargs['k']
@@ -25,17 +30,43 @@ class Artery(object):
         self._df = 4/3 * k[0] * k[1] * np.exp(k[1]*R[0])         
         self._nu = nu
         nondim = kwargs['nondim']
+        self._rc = nondim[0]
+        self._qc = nondim[1]
+        self._rho = rho
         self._Re = nondim[2]
         self._delta = delta
         self._depth = kwargs['depth']
-        
-        
-    def initial_conditions(self, u0, ntr):
+        self._windkessel = None
+        self._reductions = None
+        self._probes = []
+        self._tangents = None
+        self._storage = None
+        # 'split' integrates the viscous friction exactly after each
+        # hyperbolic step instead of explicitly inside it
+        self._friction = kwargs.get('friction', 'explicit')
+        if self._friction not in ['explicit', 'split']:
+            raise ValueError("Unknown friction treatment %s." %
+                             (self._friction))
+        
+        
+    def initial_conditions(self, u0, ntr, storage=None):
+        # storage: directory holding the time history in memory-mapped files
         if not hasattr(self, '_nx'):
             raise AttributeError('Artery not meshed. Execute mesh(self, nx) \
 before setting initial conditions.')
-        self.U = np.zeros((2, ntr, self.nx))
-        self.P = np.zeros((ntr, self.nx))
+        if storage is None:
+            self._storage = None
+            self.U = np.zeros((2, ntr, self.nx))
+            self.P = np.zeros((ntr, self.nx))
+        else:
+            self._storage = os.path.join(storage,
+                                         "%s" + "%d.npy" % (self.pos))
+            self.U = np.lib.format.open_memmap(self._storage % ('U'),
+                                               mode='w+',
+                                               shape=(2, ntr, self.nx))
+            self.P = np.lib.format.open_memmap(self._storage % ('P'),
+                                               mode='w+',
+                                               shape=(ntr, self.nx))
         self.U0 = np.zeros((2, self.nx))
         self.U0[0,:] = self.A0
         self.U0[1,:].fill(u0)
@@ -45,11 +76,24 @@ before setting initial conditions.')
         self._nx = nx
         x = np.linspace(0.0, self.L, nx)
         self._dx = x[1] - x[0]
+        if len(self.A0) != nx:
+            # resample the radius profile onto the new grid
+            R = np.interp(x, np.linspace(0.0, self.L, len(self.R)), self.R)
+            self._A0 = np.pi*R*R
         R = np.sqrt(self.A0/np.pi)
         self._xgrad = np.gradient(R, self.dx)
         #self._xgrad = self.x_grad(R)     
         
         
+    def share_geometry(self, artery):
+        # uses the geometry arrays of an identical meshed artery
+        self._R = artery.R
+        self._A0 = artery.A0
+        self._xgrad = artery.xgrad
+        self._f = artery.f
+        self._df = artery.df
+        
+        
     def x_grad(self, f):
         dx = self.dx
         xgrad = np.empty_like(f, dtype=float)
@@ -68,61 +112,214 @@ before setting initial conditions.')
         return -np.sqrt(2/3 * Ehr * np.sqrt(self.A0/a))
         
         
+    def index(self, **kwargs):
+        # grid points selected by the j and k keyword arguments of F and S
+        if 'k' in kwargs:
+            return slice(kwargs['j'], kwargs['k'])
+        elif 'j' in kwargs:
+            return kwargs['j']
+        return slice(None)
+        
+        
     def F(self, U, **kwargs):
         a, q = U
         out = np.zeros(U.shape)
         out[0] = q
-        if 'j' in kwargs:
-            j = kwargs['j']
-            a0 = self.A0[j]
-        elif 'k' in kwargs:
-            j = kwargs['j']
-            k = kwargs['k']
-            a0 = self.A0[j:k]
-        else:
-            a0 = self.A0
+        a0 = self.A0[self.index(**kwargs)]
         out[1] = q*q/a + self.f * np.sqrt(a0*a)
         return out
         
         
-    def S(self, U, **kwargs):
+    def S(self, U, dt=None, **kwargs):
+        # dt is given by the boundary conditions, with split friction they
+        # include it at the rate (1 - exp(-k dt))/dt of its exact decay over
+        # dt, which stays bounded for stiff friction; the numerical scheme
+        # leaves it to friction_step
         a, q = U
         out = np.zeros(U.shape)
-        if 'j' in kwargs:
-            j = kwargs['j']
-            a0 = self.A0[j]
-            xgrad = self.xgrad[j]
-        elif 'k' in kwargs:
-            j = kwargs['j']
-            k = kwargs['k']
-            a0 = self.A0[j:k]
-            xgrad = self.xgrad[j:k]
-        else:
-            a0 = self.A0
+        i = self.index(**kwargs)
+        a0 = self.A0[i]
+        xgrad = self.xgrad[i]
         R = np.sqrt(a0/np.pi)
-        out[1] = -2*np.pi*R*q/(self.Re*self.delta*a) +\
-                (2*np.sqrt(a) * (np.sqrt(np.pi)*self.f +\
+        out[1] = (2*np.sqrt(a) * (np.sqrt(np.pi)*self.f +\
                 np.sqrt(a0)*self.df) - a*self.df) * xgrad
+        k = 2*np.pi*R/(self.Re*self.delta*a)
+        if self.friction == 'explicit':
+            out[1] -= k*q
+        elif dt is not None:
+            out[1] -= -np.expm1(-k*dt)/dt * q
         return out
         
+        
+    def friction_step(self, U, dt):
+        # exact solution of dq/dt = -2 pi R q/(Re delta a) over dt at the
+        # interior points, a is constant during the friction step and the
+        # boundary conditions include the friction in their source term
+        R = np.sqrt(self.A0[1:-1]/np.pi)
+        U[1,1:-1] *= np.exp(-2*np.pi*R*dt/(self.Re*self.delta*U[0,1:-1]))
+        
+        
+    def F_tangent(self, U, dU, **kwargs):
+        # tangent of F, dU and the coefficient tangents have a trailing axis
+        # of sensitivity parameters
+        i = self.index(**kwargs)
+        a, q = U[0][...,None], U[1][...,None]
+        da, dq = dU
+        a0 = self.A0[i][...,None]
+        da0 = self.tangents['A0'][i]
+        s = np.sqrt(a0*a)
+        out = np.zeros(dU.shape)
+        out[0] = dq
+        out[1] = 2*q/a*dq - q*q/(a*a)*da + self.tangents['f']*s +\
+                self.f * (da0*a + a0*da)/(2*s)
+        return out
+        
+        
+    def S_tangent(self, U, dU, **kwargs):
+        # tangent of S, xgrad does not depend on the parameters because the
+        # grid spacing scales with the radius
+        i = self.index(**kwargs)
+        a, q = U[0][...,None], U[1][...,None]
+        da, dq = dU
+        a0 = self.A0[i][...,None]
+        da0 = self.tangents['A0'][i]
+        xgrad = self.xgrad[i][...,None]
+        df = self.tangents['f']
+        ddf = self.tangents['df']
+        R = np.sqrt(a0/np.pi)
+        dR = R*da0/(2*a0)
+        out = np.zeros(dU.shape)
+        out[1] = -2*np.pi/(self.Re*self.delta) * (dR*q/a + R*dq/a -\
+                R*q*da/(a*a)) + (da/np.sqrt(a) * (np.sqrt(np.pi)*self.f +\
+                np.sqrt(a0)*self.df) + 2*np.sqrt(a) * (np.sqrt(np.pi)*df +\
+                da0/(2*np.sqrt(a0))*self.df + np.sqrt(a0)*ddf) -\
+                da*self.df - a*ddf) * xgrad
+        return out
+        
+        
+    def p_tangent(self, a, da, **kwargs):
+        i = self.index(**kwargs)
+        a = a[...,None]
+        a0 = self.A0[i][...,None]
+        da0 = self.tangents['A0'][i]
+        return self.tangents['f'] * (1 - np.sqrt(a0/a)) + self.f *\
+                (np.sqrt(a0)/(2*a**1.5)*da - da0/(2*np.sqrt(a0*a)))
+        
 
-    def solve(self, lw, U_in, U_out, t, dt, save, i):
-        # solve for current timestep
-        U1 = lw.solve(self.U0, U_in, U_out, t, self.F, self.S, dt)
+    def solve(self, lw, U_in, U_out, t, dt, save, i, dU_in=None,
+              dU_out=None):
+        # solve for current timestep, the tangents are propagated as well if
+        # the tangents of the boundary conditions are given
+        if dU_in is None:
+            U1 = lw.solve(self.U0, U_in, U_out, t, self.F, self.S, dt)
+        else:
+            U1, dU1 = lw.solve_tangent(self.U0, self.dU0, U_in, U_out, dU_in,
+                                       dU_out, t, self.F, self.S,
+                                       self.F_tangent, self.S_tangent, dt,
+                                       self.tangents['dx'])
+            np.copyto(self.dU0, dU1)
+            if save:
+                self.dP[i] = self.p_tangent(U1[0,:], dU1[0])
+        self.update(U1, t, dt, save, i)
+        
+        
+    def update(self, U1, t, dt, save, i):
+        # makes U1 the current state, storing it if save
+        if self.friction == 'split':
+            self.friction_step(U1, dt)
+        self.assign(U1, t, dt, save, i)
+        
+        
+    def assign(self, U1, t, dt, save, i):
+        # makes the state U1 at the end of a complete step current, also
+        # used to copy the step of an identical artery
         np.copyto(self.U0, U1)
         if save:
-            self.P[i,:] = self.p(U1[0,:])
-            np.copyto(self.U[0,i,:], U1[0])
-            np.copyto(self.U[1,i,:], U1[1])
-        
-        
-    def dump_results(self, suffix, data_dir):
-        np.savetxt("%s/u%d_%s.csv" % (data_dir, self.pos, suffix),
-                   self.U[1,:,:], delimiter=',')
-        np.savetxt("%s/a%d_%s.csv" % (data_dir, self.pos, suffix),
-                   self.U[0,:,:], delimiter=',')  
-        np.savetxt("%s/p%d_%s.csv" % (data_dir, self.pos, suffix),
-                   self.P, delimiter=',') 
+            self.store(i)
+        if self.reductions is not None:
+            self.reductions.update(t, dt, U1[0], U1[1], self.p(U1[0,:]))
+        for probe in self.probes:
+            probe.record(t, U1)
+        
+        
+    def store(self, i):
+        # stores the current state as output time i, the time history grows
+        # if it is too short
+        n = len(self.P)
+        if i >= n:
+            self.resize(max(2*n, i+1))
+        self.P[i,:] = self.p(self.U0[0,:])
+        np.copyto(self.U[:,i,:], self.U0)
+        
+        
+    def resize(self, n):
+        # reallocates the time history for n output times keeping the first
+        # ones, memory-mapped histories are replaced by larger or smaller
+        # files in the storage directory
+        m = min(n, len(self.P))
+        if self._storage is None:
+            U = np.zeros((2, n, self.nx))
+            P = np.zeros((n, self.nx))
+        else:
+            U = np.lib.format.open_memmap(self._storage % ('U') + '.tmp',
+                                          mode='w+', shape=(2, n, self.nx))
+            P = np.lib.format.open_memmap(self._storage % ('P') + '.tmp',
+                                          mode='w+', shape=(n, self.nx))
+        U[:,:m] = self.U[:,:m]
+        P[:m] = self.P[:m]
+        if self._storage is not None:
+            # the mappings stay valid when the files are renamed
+            for name, data in [('U', U), ('P', P)]:
+                data.flush()
+                os.rename(self._storage % (name) + '.tmp',
+                          self._storage % (name))
+        self.U, self.P = U, P
+        
+        
+    def view(self, quantity, units):
+        # results of quantity 'a', 'q' or 'p' in units, see units.scale
+        data = {'a': self.U[0], 'q': self.U[1], 'p': self.P}[quantity]
+        return ScaledView(data, *scale(quantity, units, self._rc, self._qc,
+                                       self._rho))
+        
+        
+    def area(self, units='cgs'):
+        return self.view('a', units)
+        
+        
+    def flow(self, units='cgs'):
+        return self.view('q', units)
+        
+        
+    def pressure(self, units='mmHg'):
+        return self.view('p', units)
+        
+        
+    def pressure_sensitivity(self, units='mmHg'):
+        # dP in units of pressure per parameter unit, without the offset
+        return ScaledView(self.dP, scale('p', units, self._rc, self._qc,
+                                         self._rho)[0])
+        
+        
+    def dump_results(self, suffix, data_dir, fmt='csv', units=None, n=1024):
+        # fmt='npy' writes binary files that can be memory-mapped, results
+        # are written in blocks of n time steps in cgs units with pressure in
+        # mmHg unless units is given
+        results = [('u', self.flow(units or 'cgs')),
+                   ('a', self.area(units or 'cgs')),
+                   ('p', self.pressure(units or 'mmHg'))]
+        for name, data in results:
+            fname = "%s/%s%d_%s.%s" % (data_dir, name, self.pos, suffix, fmt)
+            if fmt == 'npy':
+                out = np.lib.format.open_memmap(fname, mode='w+',
+                                                shape=data.shape)
+                for i, chunk in enumerate(data.chunks(n)):
+                    out[i*n:i*n+len(chunk)] = chunk
+                del out
+            else:
+                with open(fname, 'w') as f:
+                    for chunk in data.chunks(n):
+                        np.savetxt(f, chunk, delimiter=',')
                    
                    
     def spatial_plots(self, suffix, plot_dir, n):
@@ -134,13 +331,14 @@ before setting initial conditions.')
         l = ['m^2', 'm^3/s', 'mmHg']
         positions = range(0,nt-1,skip)
         #positions = range(5)
+        U = [self.area(), self.flow()]
         for i in range(2):
-            y = self.U[i,positions,:]
+            y = U[i][positions,:]
             fname = "%s/%s_%s%d_spatial.png" % (plot_dir, suffix, u[i], self.pos)
             Artery.plot(suffix, plot_dir, x, y, positions, "m", l[i],
                         fname)
                      
-        y = self.P[positions,:] # convert to mmHg    
+        y = self.pressure()[positions,:]
         fname = "%s/%s_%s%d_spatial.png" % (plot_dir, suffix, u[2], self.pos)
         Artery.plot(suffix, plot_dir, x, y, positions, "m", l[2],
                         fname)
@@ -153,13 +351,14 @@ before setting initial conditions.')
         l = ['m^2', 'm^3/s', 'mmHg']
         positions = range(0,self.nx-1,skip)
         #positions = range(0,5)        
+        U = [self.area(), self.flow()]
         for i in range(2):
-            y = self.U[i,:,positions]
+            y = np.transpose(U[i][:,positions])
             fname = "%s/%s_%s%d_time.png" % (plot_dir, suffix, u[i], self.pos)
             Artery.plot(suffix, plot_dir, time, y, positions, "t", l[i],
                         fname)
                         
-        y = np.transpose(self.P[:,positions])   
+        y = np.transpose(self.pressure()[:,positions])
         fname = "%s/%s_%s%d_time.png" % (plot_dir, suffix, u[2], self.pos)
         Artery.plot(suffix, plot_dir, time, y, positions, "t", l[2],
                         fname)
@@ -184,7 +383,7 @@ before setting initial conditions.')
         x = np.linspace(0, self.L, len(time))
         Y, X = np.meshgrid(time, x)
         dz = int(self.nx/len(time))
-        Z = self.P[:,0:self.nx+1:dz]
+        Z = self.pressure()[:,0:self.nx+1:dz]
         surf = ax.plot_surface(X, Y, Z, rstride=1, cstride=1, cmap=cm.coolwarm,
                        linewidth=0, antialiased=False)
         fig.colorbar(surf, shrink=0.5, aspect=5)
@@ -198,7 +397,7 @@ before setting initial conditions.')
         x = np.linspace(0, self.L, len(time))
         Y, X = np.meshgrid(time, x)
         dz = int(self.nx/len(time))
-        Z = self.U[1,:,0:self.nx+1:dz]
+        Z = self.flow()[:,0:self.nx+1:dz]
         surf = ax.plot_surface(X, Y, Z, rstride=1, cstride=1, cmap=cm.coolwarm,
                        linewidth=0, antialiased=False)
         fig.colorbar(surf, shrink=0.5, aspect=5)
@@ -289,3 +488,55 @@ before setting initial conditions.')
     @property
     def depth(self):
         return self._depth
+        
+    @property
+    def windkessel(self):
+        return self._windkessel
+        
+    @windkessel.setter
+    def windkessel(self, value): 
+        self._windkessel = value
+        
+    @property
+    def reductions(self):
+        return self._reductions
+        
+    @reductions.setter
+    def reductions(self, value): 
+        self._reductions = value
+        
+    @property
+    def probes(self):
+        return self._probes
+        
+    @property
+    def friction(self):
+        return self._friction
+        
+    @property
+    def k(self):
+        return self._k
+        
+    @property
+    def tangents(self):
+        return self._tangents
+        
+    @tangents.setter
+    def tangents(self, value): 
+        self._tangents = value
+        
+    @property
+    def dU0(self):
+        return self._dU0
+        
+    @dU0.setter
+    def dU0(self, value): 
+        self._dU0 = value
+        
+    @property
+    def dP(self):
+        return self._dP
+        
+    @dP.setter
+    def dP(self, value): 
+        self._dP = value
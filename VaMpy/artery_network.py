@@ -2,35 +2,61 @@
 
 from __future__ import division
 import numpy as np
+from collections import namedtuple
 
 from artery import Artery
 from lax_wendroff import LaxWendroff
+from muscl_hancock import MusclHancock
+from reductions import Reductions
+from probes import Probe
+from blood_flow import Characteristics
 import utils
 
+import os
 import sys
 
 
+Snapshot = namedtuple('Snapshot', ['t', 'U', 'P'])
+
+
 class ArteryNetwork(object):
     """
     Class representing a network of arteries.
     """
     
     
+    # numerical schemes selectable in set_time
+    schemes = {'lax_wendroff': LaxWendroff, 'muscl_hancock': MusclHancock}
+    
+    
     def __init__(self, R, a, b, lam, rho, nu, delta, depth, **kwargs):
-        self._depth = depth
+        # generations beyond lumped_depth are replaced by Windkessels
+        self._tree_depth = depth
+        self._depth = min(kwargs.get('lumped_depth', depth), depth)
+        self._a = a
+        self._b = b
+        self._params = None
+        self._boundaries = None
+        self._sampling = None
+        self._symmetry = False
+        self._times = []
         self._arteries = []
-        self.setup_arteries(R, a, b, lam, rho, nu, delta)
+        self.setup_arteries(R, a, b, lam, rho, nu, delta, **kwargs)
         self._t = 0.0
         self._ntr = kwargs['ntr']
-        self._progress = 10
         nondim = kwargs['nondim']
         self._rc = nondim[0]
         self._qc = nondim[1]
         self._rho = rho
         self._Re = nondim[2]
+        if self.depth < self.tree_depth:
+            self.setup_windkessels(a, b, lam, rho, nu, delta, **kwargs)
         
         
-    def setup_arteries(self, R, a, b, lam, rho, nu, delta):
+    def setup_arteries(self, R, a, b, lam, rho, nu, delta, **kwargs):
+        # vessels reached by the same numbers of a and b scale factors in
+        # any order share their radius array
+        shared = {}
         pos = 0
         self.arteries.append(Artery(pos, R, lam, rho, nu, delta, depth=0, **kwargs)) 
         pos += 1
@@ -40,6 +66,8 @@ class ArteryNetwork(object):
             for radius in radii:    
                 ra = radius * a
                 rb = radius * b
+                ra = shared.setdefault(np.round(ra, 12).tobytes(), ra)
+                rb = shared.setdefault(np.round(rb, 12).tobytes(), rb)
                 self.arteries.append(Artery(pos, ra, lam, rho, nu, delta,
                                             depth=i, **kwargs))
                 pos += 1
@@ -51,22 +79,256 @@ class ArteryNetwork(object):
             radii = new_radii
             
             
-    def initial_conditions(self, u0, ntr):
+    def setup_windkessels(self, a, b, lam, rho, nu, delta, **kwargs):
+        # equivalent RCR Windkessel of the two subtrees downstream of each
+        # 1D outlet: R1 is the characteristic impedance (bounded by the
+        # total resistance), R1+R2 the total resistance and Ct the total
+        # compliance of the subtrees
+        self._impedance = {}
+        levels = self.tree_depth - self.depth
+        for artery in self.arteries[-2**(self.depth-1):]:
+            Z = Rt = Ct = 0.0
+            for s in [a, b]:
+                d = Artery(-1, artery.R*s, lam, rho, nu, delta,
+                           depth=artery.depth+1, **kwargs)
+                Zd, Rd, Cd = self.subtree_impedance(d, levels, a, b, lam,
+                                                    rho, nu, delta, **kwargs)
+                Z += 1/Zd
+                Rt += 1/Rd
+                Ct += Cd
+            R1 = min(1/Z, 1/Rt)
+            artery.windkessel = (R1, 1/Rt - R1, Ct)
+            
+            
+    def subtree_impedance(self, artery, levels, a, b, lam, rho, nu, delta,
+                          **kwargs):
+        # characteristic impedance, total resistance and total compliance of
+        # the subtree of the given number of generations rooted at artery,
+        # cached because the tree contains many identical subtrees
+        key = (np.round(artery.R, 12).tobytes(), levels)
+        if key in self._impedance:
+            return self._impedance[key]
+        x = np.linspace(0.0, artery.L, len(artery.A0))
+        r = np.sqrt(artery.A0/np.pi)
+        R = np.trapz(2*np.pi*r/(artery.Re*artery.delta*artery.A0**2), x)
+        C = np.trapz(2*artery.A0/artery.f, x)
+        Z = np.sqrt(artery.f/2)/artery.A0[0]
+        if levels == 1:
+            R1, R2, Ct = self.windkessel(self.rc, self.qc, self.rho)
+            R += R1 + R2
+            C += Ct
+        else:
+            Rt = 0.0
+            for s in [a, b]:
+                d = Artery(-1, artery.R*s, lam, rho, nu, delta,
+                           depth=artery.depth+1, **kwargs)
+                Rd, Cd = self.subtree_impedance(d, levels-1, a, b, lam, rho,
+                                                nu, delta, **kwargs)[1:]
+                Rt += 1/Rd
+                C += Cd
+            R += 1/Rt
+        self._impedance[key] = (Z, R, C)
+        return Z, R, C
+            
+            
+    def initial_conditions(self, u0, ntr=None, cache=None, storage=None):
+        # ntr=0 skips allocating the time history for streaming with
+        # iter_solve, cache is a StateCache to warm start from, storage is a
+        # directory for memory-mapped time histories
+        if ntr != 0:
+            ntr = self.ntr
+        if storage is not None and not os.path.exists(storage):
+            os.makedirs(storage)
         for artery in self.arteries:
-            artery.initial_conditions(u0, self.ntr)            
+            artery.initial_conditions(u0, ntr, storage)            
+        if cache is not None:
+            cache.load(self)
             
             
-    def mesh(self, nx):
+    def mesh(self, nx=None, dx=None, ppw=None, T=None, nh=10):
+        # nx: same number of grid points in every artery
+        # dx: largest grid spacing in every artery
+        # ppw: grid points per wavelength of the nh-th harmonic of period T
         for artery in self.arteries:
+            if ppw is not None:
+                c = np.min(np.absolute(artery.wave_speed(artery.A0)))
+                dx = c * T / (nh*ppw)
+            if dx is not None:
+                nx = max(int(np.ceil(artery.L/dx)) + 1, 3)
             artery.mesh(nx)
+        self.share_geometry()
+        
+        
+    def share_geometry(self):
+        # identical vessels share their geometry arrays, there are at most
+        # depth*(depth+1)/2 distinct vessels in the tree
+        geometry = {}
+        for artery in self.arteries:
+            key = (np.round(artery.R, 12).tobytes(), artery.nx)
+            if key in geometry:
+                artery.share_geometry(geometry[key])
+            else:
+                geometry[key] = artery
+            
+            
+    def mesh_summary(self, cfl=0.9):
+        # predicted grid size and stable time steps for the artery at rest
+        nx = [artery.nx for artery in self.arteries]
+        dt = [cfl * artery.dx / np.max(np.absolute(
+                        artery.wave_speed(artery.A0)))
+              for artery in self.arteries]
+        return {'nx': nx, 'cells': sum(nx), 'dt': min(dt), 'local_dt': dt}
             
     
-    def set_time(self, tf, dt, T=0.0, tc=1):
+    def set_time(self, tf, dt, T=0.0, tc=1, lts=False,
+                 scheme='lax_wendroff'):
+        # scheme: 'lax_wendroff' or 'muscl_hancock'
+        if scheme not in ArteryNetwork.schemes:
+            raise ValueError("Unknown scheme %s." % (scheme))
         self._dt = dt
         self._tf = tf
         self._dtr = tf/self.ntr
         self._T = T
         self._tc = tc
+        self._lts = lts
+        self._scheme = scheme
+            
+            
+    def set_reductions(self, harmonics=(), arteries=None):
+        # accumulate statistics over the last period (or the whole run if
+        # T = 0) in the given arteries, defaults to all arteries
+        if arteries is None:
+            arteries = self.arteries
+        t0 = self.tf - self.T if self.T > 0 else self.t
+        for artery in arteries:
+            artery.reductions = Reductions(artery.nx, t0, self.T, harmonics)
+            
+            
+    def add_probe(self, pos, x):
+        # record the solution at distance x from the inlet of artery pos
+        artery = self.arteries[pos]
+        probe = Probe(artery, x)
+        artery.probes.append(probe)
+        return probe
+            
+            
+    def set_sampling(self, dp=None, dq=None, max_dt=None):
+        # adaptive output: a snapshot is stored when the pressure or flow at
+        # any node changed by more than dp or dq since the last stored one,
+        # or max_dt after it; without arguments the ntr uniform output times
+        # are used
+        if dp is None and dq is None and max_dt is None:
+            self._sampling = None
+        else:
+            self._sampling = tuple(np.inf if x is None else x
+                                   for x in (dp, dq, max_dt))
+            
+            
+    def set_symmetry(self, enabled=True):
+        # solve only one of the arteries whose inflow is provably identical
+        # and copy its steps to the others, see representatives
+        self._symmetry = enabled
+        
+        
+    def representatives(self):
+        # position of the artery representing each artery; arteries whose
+        # subtrees have the same geometry, outlet parameters and state and
+        # whose parents are represented by the same artery have identical
+        # inflows at all times. With a != b only geometry is shared, the
+        # siblings differ and so does everything downstream of them
+        n = len(self.arteries)
+        leaves = n - 2**(self.depth-1)
+        default = self.windkessel(self.rc, self.qc, self.rho)
+        ids = {}
+        subtree = [None] * n
+        for artery in reversed(self.arteries):
+            p = artery.pos
+            if p >= leaves:
+                wk = default if artery.windkessel is None else\
+                        artery.windkessel
+                downstream = tuple(np.round(wk, 12))
+            else:
+                downstream = tuple(sorted([subtree[2*p+1], subtree[2*p+2]]))
+            key = (np.round(artery.R, 12).tobytes(), artery.nx,
+                   artery.U0.tobytes(), downstream)
+            subtree[p] = ids.setdefault(key, len(ids))
+        rep = []
+        first = {}
+        for artery in self.arteries:
+            p = artery.pos
+            parent = rep[(p-1)//2] if p > 0 else -1
+            rep.append(first.setdefault((parent, subtree[p]), p))
+        return rep
+        
+        
+    def set_boundaries(self, outlet='windkessel'):
+        # evaluate all boundary conditions at once from the Riemann
+        # invariants, outlet is 'windkessel' or 'non_reflecting'; None
+        # restores the boundary conditions of the individual arteries. Call
+        # after initial_conditions
+        if outlet is None:
+            self._boundaries = None
+        else:
+            self._boundaries = Characteristics(self, outlet)
+            
+            
+    def set_sensitivities(self, params):
+        # forward mode sensitivities with respect to params, a list of 'R'
+        # (relative change of all radii), 'a', 'b', 'k0', 'k1', 'k2' and
+        # the outlet Windkessel parameters 'R1', 'R2' and 'Ct'; call after
+        # initial_conditions
+        n = len(params)
+        for artery in self.arteries:
+            if artery.windkessel is not None:
+                raise ValueError("Sensitivities are not available for \
+lumped outlets.")
+            if artery.friction != 'explicit':
+                raise ValueError("Sensitivities need explicit friction.")
+            # number of a and b scale factors from the root to the artery
+            na = nb = 0
+            pos = artery.pos
+            while pos > 0:
+                if pos % 2 == 1:
+                    na += 1
+                else:
+                    nb += 1
+                pos = (pos-1)//2
+            k = artery.k
+            R0 = artery.R[0]
+            e = np.exp(k[1]*R0)
+            s = np.zeros(n) # relative change of the radius
+            df = np.zeros(n)
+            ddf = np.zeros(n)
+            dwk = np.zeros((3, n))
+            for i, param in enumerate(params):
+                if param == 'R':
+                    s[i] = 1.0
+                elif param == 'a':
+                    s[i] = na/self._a
+                elif param == 'b':
+                    s[i] = nb/self._b
+                elif param == 'k0':
+                    df[i] = 4/3 * e
+                    ddf[i] = 4/3 * k[1] * e
+                elif param == 'k1':
+                    df[i] = 4/3 * k[0] * R0 * e
+                    ddf[i] = 4/3 * k[0] * e * (1 + k[1]*R0)
+                elif param == 'k2':
+                    df[i] = 1.0
+                elif param in ['R1', 'R2', 'Ct']:
+                    dwk[['R1', 'R2', 'Ct'].index(param),i] = 1.0
+                else:
+                    raise ValueError("Unknown sensitivity parameter %s." %
+                                     (param))
+            df += artery.df * R0 * s
+            ddf += 4/3 * k[0] * k[1]**2 * e * R0 * s
+            artery.tangents = {'A0': 2*artery.A0[:,None]*s, 'f': df,
+                               'df': ddf, 'dx': artery.dx*s,
+                               'windkessel': dwk}
+            artery.dU0 = np.zeros((2, artery.nx, n))
+            artery.dU0[0] = artery.tangents['A0']
+            artery.dP = np.zeros((artery.P.shape[0], artery.nx, n))
+        self._params = list(params)
             
             
     def timestep(self):
@@ -80,41 +342,79 @@ class ArteryNetwork(object):
         U_0_n = artery.U0[:,0] # U_0_n
         U_1_n = artery.U0[:,1]
         U_12_np = (U_1_n + U_0_n)/2 + dt/2 * (-(artery.F(U_1_n, j=1) -\
-                artery.F(U_0_n, j=0))/(artery.dx) + (artery.S(U_1_n, j=1) +\
-                artery.S(U_0_n, j=0))/2) # U_1/2_n+1/2
+                artery.F(U_0_n, j=0))/(artery.dx) +\
+                (artery.S(U_1_n, dt, j=1) +\
+                artery.S(U_0_n, dt, j=0))/2) # U_1/2_n+1/2
         q_12_np = U_12_np[1] # q_1/2_n+1/2
         a_0_n1 = U_0_n[0] - 2*dt*(q_12_np - q_0_np)/artery.dx
         return np.array([a_0_n1, q_0_n1])
      
     
     @staticmethod
-    def outlet_bc(artery, dt, rc, qc, rho):
+    def inlet_bc_tangent(artery, q_in, in_t, dt):
+        # tangent of inlet_bc, the prescribed inflow does not depend on the
+        # parameters
+        dx = artery.dx
+        ddx = artery.tangents['dx']
+        q_0_np = q_in(in_t-dt/2)
+        U_0_n, U_1_n = artery.U0[:,0], artery.U0[:,1]
+        dU_0_n, dU_1_n = artery.dU0[:,0], artery.dU0[:,1]
+        F1, F0 = artery.F(U_1_n, j=1), artery.F(U_0_n, j=0)
+        S1, S0 = artery.S(U_1_n, j=1), artery.S(U_0_n, j=0)
+        dF1, dF0 = artery.F_tangent(U_1_n, dU_1_n, j=1),\
+                    artery.F_tangent(U_0_n, dU_0_n, j=0)
+        dS1, dS0 = artery.S_tangent(U_1_n, dU_1_n, j=1),\
+                    artery.S_tangent(U_0_n, dU_0_n, j=0)
+        U_12_np = (U_1_n + U_0_n)/2 + dt/2 * (-(F1 - F0)/dx + (S1 + S0)/2)
+        dU_12_np = (dU_1_n + dU_0_n)/2 + dt/2 * (-(dF1 - dF0)/dx +\
+                (F1 - F0)[:,None]*ddx/dx**2 + (dS1 + dS0)/2)
+        da = dU_0_n[0] - 2*dt*dU_12_np[1]/dx +\
+                2*dt*(U_12_np[1] - q_0_np)*ddx/dx**2
+        return np.array([da, np.zeros(len(ddx))])
+     
+    
+    @staticmethod
+    def windkessel(rc, qc, rho):
         R1 = 4100*rc**4/(qc*rho)
         R2 = 1900*rc**4/(qc*rho)
         Ct = 8.7137e-6*rho*qc**2/rc**7
+        return R1, R2, Ct
+        
+    
+    @staticmethod
+    def outlet_bc(artery, dt, rc, qc, rho):
+        if artery.windkessel is not None:
+            R1, R2, Ct = artery.windkessel
+        else:
+            R1, R2, Ct = ArteryNetwork.windkessel(rc, qc, rho)
         a_n = artery.U0[0,-1]
         q_n = artery.U0[1,-1]
         p_out = p_o = artery.p(a_n)[-1] # initial guess for p_out
         U_np_mp = (artery.U0[:,-1] + artery.U0[:,-2])/2 +\
                 dt/2 * (-(artery.F(artery.U0[:,-1], j=-1) -\
                 artery.F(artery.U0[:,-2], j=-2))/artery.dx +\
-                (artery.S(artery.U0[:,-1], j=-1) +\
-                artery.S(artery.U0[:,-2], j=-2))/2)
+                (artery.S(artery.U0[:,-1], dt, j=-1) +\
+                artery.S(artery.U0[:,-2], dt, j=-2))/2)
         U_np_mm = (artery.U0[:,-2] + artery.U0[:,-3])/2 +\
                 dt/2 * (-(artery.F(artery.U0[:,-2], j=-2) -\
                 artery.F(artery.U0[:,-3], j=-3))/artery.dx +\
-                (artery.S(artery.U0[:,-2], j=-2) +\
-                artery.S(artery.U0[:,-3], j=-3))/2)
+                (artery.S(artery.U0[:,-2], dt, j=-2) +\
+                artery.S(artery.U0[:,-3], dt, j=-3))/2)
         U_mm = artery.U0[:,-2] - dt/artery.dx * (artery.F(U_np_mm, j=-1) -\
-                artery.F(U_np_mp, j=-1)) + dt/2 * (artery.S(U_np_mm, j=-1) +\
-                artery.S(U_np_mp, j=-1))
+                artery.F(U_np_mp, j=-1)) +\
+                dt/2 * (artery.S(U_np_mm, dt, j=-1) +\
+                artery.S(U_np_mp, dt, j=-1))
         k = 0
         while k < 1000:
             p_old = p_o
             q_out = q_n + (p_o-p_out)/R1 + dt*(p_out/(R2*Ct) -\
                     q_n*(R1+R2)/(R2*Ct))/R1
             a_out = a_n - dt * (q_out - U_mm[1])/artery.dx
-            p_o = artery.p(a_out)[-1]
+            # Newton update, the plain fixed point iteration diverges for
+            # dt*dp/da > R1*dx
+            dp_da = artery.f/2 * np.sqrt(artery.A0[-1]) * a_out**(-1.5)
+            p_o = p_o - (p_o - artery.p(a_out)[-1]) /\
+                    (1 + dt*dp_da/(R1*artery.dx))
             if abs(p_old - p_o) < 1e-7:
                 break
             k += 1
@@ -122,20 +422,166 @@ class ArteryNetwork(object):
         
     
     @staticmethod
-    def bifurcation(artery, d1, d2, dt):
-        x0 = np.zeros(18)
-        Dfr = np.zeros((18, 18)) # Jacobian
-        Dfr[0,0] = Dfr[1,3] = Dfr[2,6] = Dfr[3,9] = Dfr[4,12] = Dfr[5,15] = -1
-        Dfr[6,1] = Dfr[7,4] = Dfr[8,7] = Dfr[9,10] = Dfr[10,13] = Dfr[11,16] = -1
-        Dfr[12,1] = Dfr[13,0] = -1
-        Dfr[6,2] = Dfr[7,5] = Dfr[8,8] = Dfr[9,11] = Dfr[10,14] = Dfr[11,17] = 0.5
-        Dfr[12,4] = Dfr[12,7] = Dfr[13,3] = Dfr[13,6] = 1.0
-        Dfr[3,2] = -dt/artery.dx
-        R0_p_M12 = utils.extrapolate(artery.L+artery.dx/2,
-                    [artery.L-artery.dx, artery.L],
-                    [np.sqrt(artery.A0[-2]/np.pi), np.sqrt(artery.A0[-1]/np.pi)]) 
-        Dfr[2,0] = -2*dt/artery.dx * x[2]/x[11] -\
-                    dt/2 * 2*np.pi*R0_p_M12/(delta*Re*x[11])
+    def outlet_bc_tangent(artery, dt, rc, qc, rho, U_out):
+        # tangent of outlet_bc at its converged solution U_out, obtained by
+        # differentiating the relation solved for the outlet pressure
+        R1, R2, Ct = ArteryNetwork.windkessel(rc, qc, rho)
+        dR1, dR2, dCt = artery.tangents['windkessel']
+        dx = artery.dx
+        ddx = artery.tangents['dx']
+        U, dU = artery.U0, artery.dU0
+        F = lambda j: artery.F(U[:,j], j=j)
+        S = lambda j: artery.S(U[:,j], j=j)
+        dF = lambda j: artery.F_tangent(U[:,j], dU[:,j], j=j)
+        dS = lambda j: artery.S_tangent(U[:,j], dU[:,j], j=j)
+        U_np_mp = (U[:,-1] + U[:,-2])/2 + dt/2 * (-(F(-1) - F(-2))/dx +\
+                (S(-1) + S(-2))/2)
+        U_np_mm = (U[:,-2] + U[:,-3])/2 + dt/2 * (-(F(-2) - F(-3))/dx +\
+                (S(-2) + S(-3))/2)
+        dU_np_mp = (dU[:,-1] + dU[:,-2])/2 + dt/2 * (-(dF(-1) - dF(-2))/dx +\
+                (F(-1) - F(-2))[:,None]*ddx/dx**2 + (dS(-1) + dS(-2))/2)
+        dU_np_mm = (dU[:,-2] + dU[:,-3])/2 + dt/2 * (-(dF(-2) - dF(-3))/dx +\
+                (F(-2) - F(-3))[:,None]*ddx/dx**2 + (dS(-2) + dS(-3))/2)
+        F_mm, F_mp = artery.F(U_np_mm, j=-1), artery.F(U_np_mp, j=-1)
+        U_mm = U[:,-2] - dt/dx * (F_mm - F_mp) + dt/2 *\
+                (artery.S(U_np_mm, j=-1) + artery.S(U_np_mp, j=-1))
+        dU_mm = dU[:,-2] - dt/dx * (artery.F_tangent(U_np_mm, dU_np_mm, j=-1) -\
+                artery.F_tangent(U_np_mp, dU_np_mp, j=-1)) +\
+                dt*(F_mm - F_mp)[:,None]*ddx/dx**2 + dt/2 *\
+                (artery.S_tangent(U_np_mm, dU_np_mm, j=-1) +\
+                artery.S_tangent(U_np_mp, dU_np_mp, j=-1))
+        a_n, q_n = U[:,-1]
+        da_n, dq_n = dU[:,-1]
+        a_out, q_out = U_out
+        p = lambda a: artery.f * (1 - np.sqrt(artery.A0[-1]/a))
+        dp_da = lambda a: artery.f/2 * np.sqrt(artery.A0[-1]) * a**(-1.5)
+        p_out = p(a_n)
+        p_o = p(a_out)
+        dp_out = artery.p_tangent(a_n, da_n, j=-1)
+        B = p_out/(R2*Ct) - q_n*(R1+R2)/(R2*Ct)
+        dB = dp_out/(R2*Ct) - p_out*(dR2*Ct + R2*dCt)/(R2*Ct)**2 -\
+                dq_n*(R1+R2)/(R2*Ct) - q_n*((dR1+dR2)/(R2*Ct) -\
+                (R1+R2)*(dR2*Ct + R2*dCt)/(R2*Ct)**2)
+        # dq_out = dp_o/R1 + Q, da_out = A - dt/dx*dp_o/R1
+        Q = dq_n - dp_out/R1 - (p_o - p_out)*dR1/R1**2 +\
+                dt*(dB/R1 - B*dR1/R1**2)
+        A = da_n - dt*(Q - dU_mm[1])/dx + dt*(q_out - U_mm[1])*ddx/dx**2
+        dp_o = (dp_da(a_out)*A + artery.p_tangent(a_out, 0*A, j=-1)) /\
+                (1 + dp_da(a_out)*dt/(dx*R1))
+        return np.array([A - dt/dx*dp_o/R1, dp_o/R1 + Q])
+        
+        
+    @staticmethod
+    def bifurcation(artery, d1, d2, dt, U_p=None, U_d1=None, U_d2=None):
+        # characteristic junction conditions: outgoing Riemann invariants,
+        # conservation of mass and continuity of total pressure; U_p, U_d1
+        # and U_d2 hold the two columns of each vessel next to the junction
+        if U_p is None:
+            U_p = artery.U0[:,-2:]
+        if U_d1 is None:
+            U_d1 = d1.U0[:,:2]
+        if U_d2 is None:
+            U_d2 = d2.U0[:,:2]
+        vessels = [(artery, -1, U_p[:,1], U_p[:,0]),
+                   (d1, 0, U_d1[:,0], U_d1[:,1]),
+                   (d2, 0, U_d2[:,0], U_d2[:,1])]
+        a0 = np.array([v[0].A0[v[1]] for v in vessels])
+        f = np.array([v[0].f for v in vessels])
+        dx = np.array([v[0].dx for v in vessels])
+        sign = np.array([-1.0, 1.0, 1.0])
+        Ub = np.array([v[2] for v in vessels]).T
+        Ui = np.array([v[3] for v in vessels]).T
+        # interpolate the state at the foot of the outgoing characteristic
+        c = np.sqrt(f/2 * np.sqrt(a0/Ub[0]))
+        lam = np.absolute(Ub[1]/Ub[0] - sign*c) * dt/dx
+        a, q = Ub + lam * (Ui - Ub)
+        c = np.sqrt(f/2 * np.sqrt(a0/a))
+        W = q/a + sign*4*c
+        x = Ub.copy()
+        for k in range(100):
+            res, J = ArteryNetwork.junction_system(x, a0, f, sign, W)
+            dx_k = np.linalg.solve(J, -res)
+            x += dx_k.reshape((3, 2)).T
+            if np.max(np.absolute(dx_k)) < 1e-10:
+                break
+        return x[:,0], x[:,1], x[:,2]
+        
+        
+    @staticmethod
+    def junction_system(x, a0, f, sign, W):
+        # residual and Jacobian of the junction conditions for the states x
+        a, q = x
+        c = np.sqrt(f/2 * np.sqrt(a0/a))
+        P = f * (1 - np.sqrt(a0/a)) + q*q/(2*a*a)
+        dP_da = f/2 * np.sqrt(a0) * a**(-1.5) - q*q/a**3
+        res = np.zeros(6)
+        res[:3] = q/a + sign*4*c - W
+        res[3] = q[0] - q[1] - q[2]
+        res[4] = P[0] - P[1]
+        res[5] = P[0] - P[2]
+        J = np.zeros((6, 6))
+        for j in range(3):
+            J[j,2*j] = -q[j]/(a[j]*a[j]) - sign[j]*c[j]/a[j]
+            J[j,2*j+1] = 1/a[j]
+        J[3,1] = 1.0
+        J[3,3] = J[3,5] = -1.0
+        J[4,0] = J[5,0] = dP_da[0]
+        J[4,1] = J[5,1] = q[0]/(a[0]*a[0])
+        J[4,2] = -dP_da[1]
+        J[4,3] = -q[1]/(a[1]*a[1])
+        J[5,4] = -dP_da[2]
+        J[5,5] = -q[2]/(a[2]*a[2])
+        return res, J
+        
+        
+    @staticmethod
+    def bifurcation_tangent(artery, d1, d2, dt, U):
+        # tangents of the junction states U returned by bifurcation, found
+        # from the implicit function theorem applied to the junction system
+        vessels = [(artery, -1, -2), (d1, 0, 1), (d2, 0, 1)]
+        a0 = np.array([v[0].A0[v[1]] for v in vessels])
+        f = np.array([v[0].f for v in vessels])
+        dx = np.array([v[0].dx for v in vessels])
+        Ub = np.array([v[0].U0[:,v[1]] for v in vessels]).T
+        Ui = np.array([v[0].U0[:,v[2]] for v in vessels]).T
+        da0 = np.array([v[0].tangents['A0'][v[1]] for v in vessels])
+        df = np.array([v[0].tangents['f'] for v in vessels])
+        ddx = np.array([v[0].tangents['dx'] for v in vessels])
+        dUb = np.array([v[0].dU0[:,v[1]] for v in vessels]).transpose(1,0,2)
+        dUi = np.array([v[0].dU0[:,v[2]] for v in vessels]).transpose(1,0,2)
+        sign = np.array([-1.0, 1.0, 1.0])[:,None]
+        a0, f, dx = a0[:,None], f[:,None], dx[:,None]
+        
+        def c_tangent(a, da):
+            s = np.sqrt(a0/a)
+            c = np.sqrt(f/2 * s)
+            return c, (df/2 * s + f/4 * (da0/a - a0*da/(a*a))/s) / (2*c)
+        
+        # tangent of the outgoing invariants at the foot of the
+        # characteristics
+        ab, qb = Ub[0][:,None], Ub[1][:,None]
+        cb, dcb = c_tangent(ab, dUb[0])
+        v = qb/ab - sign*cb
+        dv = (dUb[1] - qb/ab*dUb[0])/ab - sign*dcb
+        lam = np.absolute(v) * dt/dx
+        dlam = np.sign(v) * dv * dt/dx - lam*ddx/dx
+        a, q = Ub[:,:,None] + lam * (Ui - Ub)[:,:,None]
+        da, dq = dUb + dlam * (Ui - Ub)[:,:,None] + lam * (dUi - dUb)
+        c, dc = c_tangent(a, da)
+        dW = (dq - q/a*da)/a + sign*4*dc
+        # partial derivatives of the residual at fixed junction states
+        a, q = U[0][:,None], U[1][:,None]
+        c, dc = c_tangent(a, 0*da)
+        s = np.sqrt(a0/a)
+        dP = df*(1 - s) - f*da0/(2*a*s)
+        dres = np.zeros((6, dW.shape[1]))
+        dres[:3] = sign*4*dc - dW
+        dres[4] = dP[0] - dP[1]
+        dres[5] = dP[0] - dP[2]
+        res, J = ArteryNetwork.junction_system(U, a0[:,0], f[:,0],
+                                               sign[:,0], 0)
+        dU = np.linalg.solve(J, -dres).reshape((3, 2, -1))
+        return dU[0], dU[1], dU[2]
     
     
     @staticmethod
@@ -149,70 +595,258 @@ class ArteryNetwork(object):
         return False if (left > right).any() else True
             
     
-    def solve(self, q_in, p_out, T):
-        tr = np.linspace(self.tf-self.T, self.tf, self.ntr)
-        i = 0
-        self.timestep()
-        while self.t < self.tf:
-            save = False  
-            
-            if i < self.ntr and (abs(tr[i]-self.t) < self.dtr or self.t >= self.tf-self.dt):
-                save = True
-                i += 1
-                
-            for artery in self.arteries:
-                lw = LaxWendroff(artery.nx, artery.dx)
+    @staticmethod
+    def stable_dt(artery, cfl=0.9):
+        a = artery.U0[0,:]
+        c = artery.wave_speed(a)
+        u = artery.U0[1,:] / a
+        return cfl * artery.dx / np.max(np.absolute(u) + np.absolute(c))
+        
+        
+    def substeps(self):
+        # number of local time steps per global time step for each artery
+        m = []
+        for artery in self.arteries:
+            if self.lts:
+                n = int(np.ceil(self.dt / self.stable_dt(artery)))
+                m.append(2**int(np.ceil(np.log2(max(n, 1)))))
+            else:
+                m.append(1)
+        return m
+        
+        
+    def boundary_state(self, artery, end, t):
+        # boundary columns of artery interpolated to time t
+        if end == 0:
+            U_prev = self._U_prev[artery.pos][:,:2]
+            U_now = artery.U0[:,:2]
+        else:
+            U_prev = self._U_prev[artery.pos][:,2:]
+            U_now = artery.U0[:,-2:]
+        t_prev, t_now = self._t_local[artery.pos]
+        if t >= t_now:
+            return U_now
+        elif t <= t_prev:
+            return U_prev
+        theta = (t - t_prev) / (t_now - t_prev)
+        return (1-theta) * U_prev + theta * U_now
+        
+        
+    def junction(self, artery, t, dt):
+        # states at the junction of artery with its daughters at time t+dt
+        key = (artery.pos, t, dt)
+        if key not in self._junctions:
+            d1 = self.arteries[2*artery.pos+1]
+            d2 = self.arteries[2*artery.pos+2]
+            self._junctions[key] = self.bifurcation(artery, d1, d2, dt,
+                                    self.boundary_state(artery, -1, t),
+                                    self.boundary_state(d1, 0, t),
+                                    self.boundary_state(d2, 0, t))
+        return self._junctions[key]
+        
+        
+    def junction_tangent(self, artery, t, dt):
+        # tangents of the junction states, sensitivities are only available
+        # without local time stepping so the boundary states are current
+        key = (artery.pos, t, dt)
+        if key not in self._junction_tangents:
+            d1 = self.arteries[2*artery.pos+1]
+            d2 = self.arteries[2*artery.pos+2]
+            U = np.array(self.junction(artery, t, dt)).T
+            self._junction_tangents[key] = self.bifurcation_tangent(artery,
+                                            d1, d2, dt, U)
+        return self._junction_tangents[key]
+        
+        
+    def step(self, q_in, save, i):
+        # advance all arteries from t-dt to t, subcycling arteries whose
+        # local stable time step is smaller than dt
+        t0 = self.t - self.dt
+        m = self._substeps
+        M = max(m)
+        order = sorted(range(len(self.arteries)), key=lambda k: m[k])
+        self._junctions = {}
+        self._junction_tangents = {}
+        if self.boundaries is not None:
+            in_t = utils.periodic(self.t, self.T) if self.T > 0 else self.t
+            bc_in, bc_out = self.boundaries.solve(q_in(in_t), self.dt)
+        for s in range(M):
+            ts = t0 + s*self.dt/M
+            for k in order:
+                r = M // m[k]
+                if s % r != 0 or self._representative[k] != k:
+                    continue
+                artery = self.arteries[k]
+                dt = self.dt / m[k]
+                t = ts + dt
                 
-                if artery.pos == 0:
+                if self.boundaries is not None:
+                    U_in = bc_in[:,k]
+                elif artery.pos == 0:
                     # inlet boundary condition
                     if self.T > 0:
-                        in_t = utils.periodic(self.t, self.T)
+                        in_t = utils.periodic(t, self.T)
                     else:
-                        in_t = self.t
-                    U_in = self.inlet_bc(artery, q_in, in_t, self.dt)
+                        in_t = t
+                    U_in = self.inlet_bc(artery, q_in, in_t, dt)
+                    if self.params is not None:
+                        dU_in = self.inlet_bc_tangent(artery, q_in, in_t, dt)
                 else:
-                    #todo: bifurcation inlet boundary
-                    pass
-                if artery.pos >= (len(self.arteries) - 2**(self.depth-1)):
+                    # bifurcation inlet boundary
+                    p = self.arteries[(artery.pos-1)//2]
+                    U_in = self.junction(p, ts, dt)[2-artery.pos%2]
+                    if self.params is not None:
+                        dU_in = self.junction_tangent(p, ts, dt)[
+                                                        2-artery.pos%2]
+                if self.boundaries is not None:
+                    U_out = bc_out[:,k]
+                elif artery.pos >= (len(self.arteries) - 2**(self.depth-1)):
                     # outlet boundary condition
-                    U_out = self.outlet_bc(artery, self.dt, self.rc,
-                                                    self.qc, self.rho)
+                    U_out = self.outlet_bc(artery, dt, self.rc, self.qc,
+                                           self.rho)
+                    if self.params is not None:
+                        dU_out = self.outlet_bc_tangent(artery, dt, self.rc,
+                                            self.qc, self.rho, U_out)
                 else:
-                    #todo: bifurcation outlet condition
-                    pass
-                #else:
-                #    d1_pos = artery.pos + 2**artery.depth
-                #    d2_pos = d1_pos + 1
-                #    d1 = self.arteries[d1_pos]
-                #    d2 = self.arteries[d2_pos]
-                #    U_out, U_in1, U_in2 = self.bifurcation(artery, d1, d2,
-                #                                           self.dt)
+                    # bifurcation outlet boundary
+                    U_out = self.junction(artery, ts, dt)[0]
+                    if self.params is not None:
+                        dU_out = self.junction_tangent(artery, ts, dt)[0]
+                if self.params is None:
+                    dU_in = dU_out = None
+                    
+                self._U_prev[k][:,:2] = artery.U0[:,:2]
+                self._U_prev[k][:,2:] = artery.U0[:,-2:]
+                self._t_local[k] = (ts, t)
+                artery.solve(self._lw[k], U_in, U_out, t, dt,
+                             save and s+r == M, i, dU_in, dU_out)
                 
-                artery.solve(lw, U_in, U_out, self.t, self.dt, save, i-1)
+                for alias in self._aliases[k]:
+                    # identical inflow, the step is copied
+                    self._U_prev[alias.pos][:] = self._U_prev[k]
+                    self._t_local[alias.pos] = (ts, t)
+                    alias.assign(artery.U0, t, dt, save and s+r == M, i)
                 
-                if ArteryNetwork.cfl_condition(artery, self.dt) == False:
+                if ArteryNetwork.cfl_condition(artery, dt) == False:
                     raise ValueError(
                             "CFL condition not fulfilled at time %e. Reduce \
-time step size." % (self.t))
-                    sys.exit(1)  
-                    
+time step size." % (t))
+            
+    
+    def schedule(self, history=True):
+        # generator advancing the time by one step per iteration, yields
+        # whether the step is stored and its index among the ntr output
+        # times; adaptive samples are taken once the step has been made
+        tr = np.linspace(self.tf-self.T, self.tf, self.ntr)
+        adaptive = history and self.sampling is not None
+        i = 0
+        self._times = []
+        self.timestep()
+        while self.t < self.tf:
+            save = False  
+            
+            if history and not adaptive and i < self.ntr and (abs(tr[i]-self.t) < self.dtr or self.t >= self.tf-self.dt):
+                save = True
+                i += 1
+                self._times.append(self.t)
+                
+            yield save, i-1
+            if adaptive:
+                self.sample()
             self.timestep()
             
-            if self.t % (self.tf/10) < self.dt:
-                print "Progress {:}%".format(self._progress)
-                self._progress += 10
+        if adaptive:
+            n = len(self._times)
+            for artery in self.arteries:
+                artery.resize(n)
                 
-        
-        # redimensionalise
-        for artery in self.arteries:
-            artery.P = 85 + artery.P*self.rho*self.qc**2*760 / (1.01325*10**6*self.rc**4)
-            artery.U[0,:,:] = artery.U[0,:,:] * self.rc**2  
-            artery.U[1,:,:] = artery.U[1,:,:] * self.qc
                 
+    def sample(self):
+        # stores the current state if it changed by more than the sampling
+        # tolerances, over the last period (or the whole run if T = 0) and
+        # at least at its first and last time step
+        dp, dq, max_dt = self.sampling
+        if self.T > 0 and self.t < self.tf - self.T - self.dt/2:
+            return
+        n = len(self._times)
+        save = n == 0 or self.t >= self.tf - self.dt or\
+               self.t - self._times[-1] >= max_dt - self.dt/2
+        save = save or any(
+                np.max(np.absolute(artery.p(artery.U0[0,:]) -
+                                   artery.P[n-1])) > dp or
+                np.max(np.absolute(artery.U0[1] - artery.U[1,n-1])) > dq
+                for artery in self.arteries)
+        if save:
+            for artery in self.arteries:
+                artery.store(n)
+            self._times.append(self.t)
+            
+            
+    def run(self, q_in, history=True, progress=None):
+        # generator advancing the network by one time step per iteration,
+        # the results at the ntr output times are only stored if history
+        if self.params is not None and (self.lts or
+                                        self.scheme != 'lax_wendroff'):
+            raise ValueError("Sensitivities are only available for the \
+Lax-Wendroff scheme without local time stepping.")
+        if self.params is not None and self.sampling is not None:
+            raise ValueError("Sensitivities are only stored at the ntr \
+uniform output times.")
+        if self.boundaries is not None and (self.lts or
+                                            self.params is not None):
+            raise ValueError("Characteristic boundaries are not available \
+with local time stepping or sensitivities.")
+        if self.symmetry and self.params is not None:
+            raise ValueError("Identical arteries have different \
+sensitivities.")
+        rep = self.representatives() if self.symmetry else\
+                range(len(self.arteries))
+        self._aliases = [[] for artery in self.arteries]
+        for artery in self.arteries:
+            if rep[artery.pos] != artery.pos:
+                self._aliases[rep[artery.pos]].append(artery)
+        self._representative = rep
+        self._substeps = self.substeps()
+        self._lw = [ArteryNetwork.schemes[self.scheme](artery.nx, artery.dx)
+                    for artery in self.arteries]
+        self._U_prev = [np.zeros((2, 4)) for artery in self.arteries]
+        self._t_local = [(self.t, self.t) for artery in self.arteries]
+        if progress is not None:
+            progress.start(self)
+        for save, i in self.schedule(history):
+            self.step(q_in, save, i)
+            if progress is not None:
+                progress.update(self)
+            yield self.t
+            
+        if progress is not None:
+            progress.finish(self)
+            
             
-    def dump_results(self, suffix, data_dir):
+    def iter_solve(self, q_in, every=1, progress=None):
+        # yields nondimensional snapshots every given number of time steps
+        # without storing the time history; U holds views of the current
+        # state of each artery, which are overwritten by the next step
+        n = 0
+        for t in self.run(q_in, history=False, progress=progress):
+            n += 1
+            if n % every == 0:
+                yield Snapshot(t, [artery.U0 for artery in self.arteries],
+                               [artery.p(artery.U0[0,:])
+                                for artery in self.arteries])
+            
+    
+    def solve(self, q_in, p_out, T, progress=None):
+        # progress: optional Progress instance receiving throughput and ETA;
+        # results stay nondimensional, Artery.area, flow and pressure give
+        # views in physical units
+        for t in self.run(q_in, progress=progress):
+            pass
+            
+            
+    def dump_results(self, suffix, data_dir, fmt='csv', units=None):
         for artery in self.arteries:
-            artery.dump_results(suffix, data_dir)
+            artery.dump_results(suffix, data_dir, fmt, units)
                        
                        
     def spatial_plots(self, suffix, plot_dir, n):
@@ -221,13 +855,13 @@ time step size." % (self.t))
         
         
     def time_plots(self, suffix, plot_dir, n):
-        time = np.linspace(self.tf-self.T, self.tf, self.ntr)
+        time = self.times
         for artery in self.arteries:
             artery.time_plots(suffix, plot_dir, n, time)
             
     
     def s3d_plots(self, suffix, plot_dir):
-        time = np.linspace(self.tf-self.T, self.tf, self.ntr)
+        time = self.times
         for artery in self.arteries:
             artery.p3d_plot(suffix, plot_dir, time)
             artery.q3d_plot(suffix, plot_dir, time)
@@ -238,6 +872,47 @@ time step size." % (self.t))
         return self._depth
         
         
+    @property
+    def sampling(self):
+        return self._sampling
+        
+    @property
+    def times(self):
+        # times of the stored results
+        return np.array(self._times)
+        
+    @times.setter
+    def times(self, value):
+        self._times = list(value)
+        
+    @property
+    def boundaries(self):
+        return self._boundaries
+        
+    @property
+    def symmetry(self):
+        return self._symmetry
+        
+    @property
+    def params(self):
+        return self._params
+        
+        
+    @property
+    def tree_depth(self):
+        return self._tree_depth
+        
+        
+    @property
+    def a(self):
+        return self._a
+        
+        
+    @property
+    def b(self):
+        return self._b
+        
+        
     @property
     def arteries(self):
         return self._arteries
@@ -272,6 +947,20 @@ time step size." % (self.t))
     def t(self):
         return self._t
         
+    @t.setter
+    def t(self, value):
+        self._t = value
+        
+        
+    @property
+    def lts(self):
+        return self._lts
+        
+        
+    @property
+    def scheme(self):
+        return self._scheme
+        
         
     @property
     def ntr(self):
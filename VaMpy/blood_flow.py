@@ -1,59 +1,213 @@
 # -*- coding: utf-8 -*-
 
-import numpy as np
-
+from __future__ import division
 
-def extrapolate(x0, x, y):
-    return y[0] + (y[1]-y[0]) * (x0 - x[0])/(x[1] - x[0])
+import numpy as np
 
 
-def wave_speed(a, beta, rho):
-    return np.sqrt(beta*np.sqrt(a)/(2*rho))
+def wave_speed(a, a0, f):
+    """
+    Wave speed of the tube law p = f (1 - sqrt(a0/a)) with unit density.
     
+    :param a: Cross-sectional area.
+    :param a0: Reference cross-sectional area.
+    :param f: Wall stiffness.
+    :returns: Wave speed c, which decreases with a.
+    """
+    return np.sqrt(f/2 * np.sqrt(a0/a))
     
-def bifurcation_system(u_prev):
-    F = np.zeros(6)
-    F[0] = calculate_characteristic(u_prev[0,0], u_prev[1,0:2], u_prev[1,0],
-                                   beta, rho, dt, x[0:2])
     
+def area(c, a0, f):
+    """
+    Cross-sectional area for a wave speed, inverse of wave_speed.
     
-def jacobian(A_p, u_p, A_1, u_1, A_2, u_2):
-    J = np.zeros((6,6))
-    J[0,:] = [-1, -A_p**(-3/4) * np.sqrt(beta_p/2/rho), 0, 0, 0, 0]
-    J[1,:] = [0, 0, -1, A_1**(-3/4) * np.sqrt(beta_1/2/rho), 0, 0]
-    J[2,:] = [0, 0, 0, 0, -1, A_2**(-3/4) * np.sqrt(beta_2/2/rho)]
-    J[3,:] = [A_p, u_p, -A_1, -u_1, -A_2, -u_2]
-    J[4,:] = [rho*u_p, beta_p/2*A_p**(-1/2), -rho*u_1, -beta_1/2*A_1**(-1/2),\
-                0, 0]
-    J[5,:] = [rho*u_p, beta_p/2*A_p**(-1/2), 0, 0, -rho*u_2,\
-                -beta_2/2*A_2**(-1/2)]
-    return J
+    :param c: Wave speed.
+    :param a0: Reference cross-sectional area.
+    :param f: Wall stiffness.
+    :returns: Cross-sectional area.
+    """
+    return a0 * (f/(2*c*c))**2
     
-
-def inlet_bc(u_prev, t, (u_in, beta, rho, x, dt)):
-    w_2 = calculate_characteristic(u_prev[0,0], u_prev[1,0:2], u_prev[1,0],
-                                   beta, rho, dt, x[0:2])
-    a_in = (u_in(t) - w_2)**4 / 64 * (rho/beta)**2
-    return np.array([a_in, u_in(t)])
-     
-    
-def outlet_bc(u_prev, t, (a_out, beta, rho, x, dt)):
-    w_1 = calculate_characteristic(u_prev[0,-1], u_prev[1,-2:], u_prev[1,-1],
-                                   beta, rho, dt, x[-2:])
-    u_out = w_1 - 4*a_out**(1/4) * np.sqrt(beta/(2*rho))
-    return np.array([a_out, u_out])
-    
-    
-def bifurcation_bc(p, d1, d2):
-    uprev_p = p.get_uprev()
-    F = bifurcation_system(u_prev)
-    return 
-        
-    
-def cfl_condition(u, (beta, rho, dt, dx)):
-    c = wave_speed(u[0], beta, rho)
-    v = (u[1] + c, u[1] - c)
-    left = dt/dx
-    right = np.power(np.absolute(v), -1)
-    #print left, right
-    return False if (left > right).any() else True
\ No newline at end of file
+    
+class Characteristics(object):
+    """
+    Class evaluating the boundary conditions of all arteries of a network in
+    one vectorised call per time step from the Riemann invariants
+    W = u + sign*4c reaching the boundary nodes, sign is 1 at the inlet and
+    -1 at the outlet of an artery.
+    """
+    
+    
+    def __init__(self, network, outlet='windkessel'):
+        # outlet: 'windkessel' or 'non_reflecting', the initial conditions of
+        # network set the Windkessel pressures and the incoming invariants of
+        # non-reflecting outlets
+        if outlet not in ['windkessel', 'non_reflecting']:
+            raise ValueError("Unknown outlet %s." % (outlet))
+        arteries = network.arteries
+        n = len(arteries)
+        leaves = n - 2**(network.depth-1)
+        self._network = network
+        self._outlet = outlet
+        # ends 0 to n-1 are the inlets of the arteries, n to 2n-1 the outlets
+        self._a0 = np.array([artery.A0[0] for artery in arteries] +
+                            [artery.A0[-1] for artery in arteries])
+        self._f = np.tile([artery.f for artery in arteries], 2)
+        self._dx = np.tile([artery.dx for artery in arteries], 2)
+        self._sign = np.repeat([1.0, -1.0], n)
+        self._outlets = n + np.arange(leaves, n)
+        p = np.arange(leaves)
+        self._junctions = np.array([n+p, 2*p+1, 2*p+2]).T.reshape((-1, 3))
+        default = network.windkessel(network.rc, network.qc, network.rho)
+        self._R1, self._R2, self._Ct = np.array(
+                    [default if artery.windkessel is None else
+                     artery.windkessel for artery in arteries[leaves:]]).T
+        a, q = self.ends()[0][:,self._outlets]
+        a0, f = self._a0[self._outlets], self._f[self._outlets]
+        self._Pc = f*(1 - np.sqrt(a0/a)) - self._R1*q
+        self._W0 = q/a + 4*wave_speed(a, a0, f)
+        
+        
+    def ends(self):
+        # boundary nodes and their interior neighbours, shape (2, 2n)
+        E = np.array([artery.U0[:,[0, 1, -2, -1]]
+                      for artery in self._network.arteries])
+        Ub = np.concatenate((E[:,:,0], E[:,:,3])).T
+        Ui = np.concatenate((E[:,:,1], E[:,:,2])).T
+        return Ub, Ui
+        
+        
+    def invariants(self, Ub, Ui, dt):
+        # outgoing invariants at the foot of the characteristics through the
+        # boundary nodes, interpolated between the nodes and their neighbours
+        a0, f, sign = self._a0, self._f, self._sign
+        c = wave_speed(Ub[0], a0, f)
+        lam = np.absolute(Ub[1]/Ub[0] - sign*c) * dt/self._dx
+        a, q = Ub + lam * (Ui - Ub)
+        return q/a + sign*4*wave_speed(a, a0, f)
+        
+        
+    def solve(self, q_in, dt):
+        # inlet and outlet states of all arteries at the end of the step for
+        # the inlet flow q_in, shape (2, n) each; advances the Windkessels
+        n = len(self._network.arteries)
+        Ub, Ui = self.ends()
+        W = self.invariants(Ub, Ui, dt)
+        U = np.zeros((2, 2*n))
+        U[:,0] = self.inlet(q_in, W[0], Ub[0,0])
+        o = self._outlets
+        if self._outlet == 'windkessel':
+            U[:,o] = self.windkessel(W[o], Ub[0,o], dt)
+        else:
+            U[:,o] = self.non_reflecting(W[o])
+        j = self._junctions
+        U[:,j] = self.junctions(W[j], Ub[:,j])
+        return U[:,:n], U[:,n:]
+        
+        
+    def inlet(self, q, W, a):
+        # area for the prescribed flow, q/a + 4c = W
+        a0, f = self._a0[0], self._f[0]
+        for k in range(100):
+            c = wave_speed(a, a0, f)
+            da = (q/a + 4*c - W) / (-q/(a*a) - c/a)
+            a -= da
+            if abs(da) < 1e-12*a:
+                break
+        return a, q
+        
+        
+    def windkessel(self, W, a, dt):
+        # three element Windkessels, p - R1 q equals the capacitor pressure
+        # after a backward Euler step, which is linear in q
+        o = self._outlets
+        a0, f = self._a0[o], self._f[o]
+        R1, R2, Ct = self._R1, self._R2, self._Ct
+        D = 1 + dt/(R2*Ct)
+        Pc = self._Pc / D
+        R = R1 + dt/(Ct*D)
+        for k in range(100):
+            c = wave_speed(a, a0, f)
+            q = a * (W + 4*c)
+            r = f*(1 - np.sqrt(a0/a)) - Pc - R*q
+            dr = f/2 * np.sqrt(a0) * a**(-1.5) - R*(W + 3*c)
+            da = r/dr
+            a -= da
+            if np.max(np.absolute(da/a)) < 1e-12:
+                break
+        q = a * (W + 4*wave_speed(a, a0, f))
+        self._Pc = (self._Pc + dt*q/Ct) / D
+        return a, q
+        
+        
+    def non_reflecting(self, W):
+        # the incoming invariants keep their initial values
+        o = self._outlets
+        c = (self._W0 - W) / 8
+        a = area(c, self._a0[o], self._f[o])
+        return a, a * (self._W0 + W)/2
+        
+        
+    def junctions(self, W, Ub):
+        # outgoing invariants, conservation of mass and continuity of total
+        # pressure at all junctions, Newton iterations on the stacked systems
+        # of ArteryNetwork.junction_system; W has shape (m, 3) and Ub
+        # (2, m, 3) for the parent and the daughters of m junctions
+        j = self._junctions
+        a0, f, sign = self._a0[j], self._f[j], self._sign[j]
+        a, q = Ub[0].copy(), Ub[1].copy()
+        m = len(a)
+        if m == 0:
+            return np.array([a, q])
+        res = np.zeros((m, 6))
+        J = np.zeros((m, 6, 6))
+        i = np.arange(3)
+        J[:,3,1] = 1.0
+        J[:,3,3] = J[:,3,5] = -1.0
+        for k in range(100):
+            c = wave_speed(a, a0, f)
+            P = f * (1 - np.sqrt(a0/a)) + q*q/(2*a*a)
+            dP_da = f/2 * np.sqrt(a0) * a**(-1.5) - q*q/a**3
+            res[:,:3] = q/a + sign*4*c - W
+            res[:,3] = q[:,0] - q[:,1] - q[:,2]
+            res[:,4] = P[:,0] - P[:,1]
+            res[:,5] = P[:,0] - P[:,2]
+            J[:,i,2*i] = -q/(a*a) - sign*c/a
+            J[:,i,2*i+1] = 1/a
+            J[:,4,0] = J[:,5,0] = dP_da[:,0]
+            J[:,4,1] = J[:,5,1] = q[:,0]/(a[:,0]*a[:,0])
+            J[:,4,2] = -dP_da[:,1]
+            J[:,4,3] = -q[:,1]/(a[:,1]*a[:,1])
+            J[:,5,4] = -dP_da[:,2]
+            J[:,5,5] = -q[:,2]/(a[:,2]*a[:,2])
+            dx = np.linalg.solve(J, -res[:,:,None])[:,:,0]
+            a += dx[:,0::2]
+            q += dx[:,1::2]
+            if np.max(np.absolute(dx)) < 1e-10:
+                break
+        return np.array([a, q])
+        
+        
+    def state(self):
+        # state of the outlets besides the arteries: the Windkessel
+        # pressures and the incoming invariants of non-reflecting outlets
+        return {'Pc': self._Pc.copy(), 'W0': self._W0.copy()}
+        
+        
+    def load(self, data):
+        # restores a state returned by state
+        if np.shape(data['Pc']) != self._Pc.shape:
+            raise ValueError("State of %d outlets for a network of %d \
+outlets." % (len(data['Pc']), len(self._Pc)))
+        self._Pc = np.array(data['Pc'], dtype=float)
+        self._W0 = np.array(data['W0'], dtype=float)
+        
+        
+    @property
+    def outlet(self):
+        return self._outlet
+        
+    @property
+    def Pc(self):
+        return self._Pc
+        
\ No newline at end of file
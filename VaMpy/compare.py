@@ -0,0 +1,153 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import division
+
+import os
+import sys
+import glob
+import numpy as np
+
+
+def open_results(data_dir, name, pos, suffix):
+    """
+    Opens the results written by Artery.dump_results lazily.
+    
+    Binary results are memory-mapped, CSV results are read line by line.
+    
+    :param data_dir: Directory containing the results.
+    :param name: Quantity, one of 'a', 'u' or 'p'.
+    :param pos: Position of the artery in the network.
+    :param suffix: Suffix of the run.
+    :returns: Memory-mapped array or name of the CSV file.
+    """
+    fname = "%s/%s%d_%s" % (data_dir, name, pos, suffix)
+    if os.path.exists(fname + '.npy'):
+        return np.load(fname + '.npy', mmap_mode='r')
+    elif os.path.exists(fname + '.csv'):
+        return fname + '.csv'
+    raise IOError("No results found for %s." % (fname))
+    
+    
+def chunks(data, n):
+    # blocks of at most n time steps
+    if isinstance(data, np.ndarray):
+        for i in range(0, data.shape[0], n):
+            yield np.asarray(data[i:i+n])
+    else:
+        rows = []
+        with open(data, 'r') as f:
+            for line in f:
+                rows.append([float(v) for v in line.split(',')])
+                if len(rows) == n:
+                    yield np.array(rows)
+                    rows = []
+        if len(rows) > 0:
+            yield np.array(rows)
+            
+            
+def steps(data):
+    # number of time steps, CSV files are counted without parsing them
+    if isinstance(data, np.ndarray):
+        return data.shape[0]
+    with open(data, 'r') as f:
+        return sum(1 for line in f)
+        
+        
+def positions(data_dir, suffix):
+    pos = []
+    for fname in glob.glob("%s/p*_%s.*" % (data_dir, suffix)):
+        name = os.path.basename(fname)
+        pos.append(int(name[1:name.index('_')]))
+    return sorted(set(pos))
+    
+    
+def compare_quantity(data, ref, n=1024):
+    # error norms of data with respect to ref, accumulated over blocks of n
+    # time steps; the peak shift is the difference in the index of the
+    # output sample holding the maximum at every grid point, the results do
+    # not store their output times, which need not be uniform
+    if steps(data) != steps(ref):
+        raise ValueError("Results have different numbers of time steps.")
+    N = 0
+    sq = sq_ref = linf = linf_ref = 0.0
+    peak = peak_ref = None
+    step = 0
+    for x, y in zip(chunks(data, n), chunks(ref, n)):
+        if x.shape != y.shape:
+            raise ValueError("Results have different shapes.")
+        d = x - y
+        N += d.size
+        sq += np.sum(d*d)
+        sq_ref += np.sum(y*y)
+        linf = max(linf, np.max(np.absolute(d)))
+        linf_ref = max(linf_ref, np.max(np.absolute(y)))
+        if peak is None:
+            peak = [np.argmax(x, axis=0), np.max(x, axis=0)]
+            peak_ref = [np.argmax(y, axis=0), np.max(y, axis=0)]
+        else:
+            for p, z in [(peak, x), (peak_ref, y)]:
+                m = np.max(z, axis=0)
+                new = m > p[1]
+                p[0][new] = np.argmax(z, axis=0)[new] + step
+                p[1][new] = m[new]
+        step += x.shape[0]
+    shift = peak[0] - peak_ref[0]
+    return {'L2': np.sqrt(sq/N), 'Linf': linf,
+            'rel_L2': np.sqrt(sq/sq_ref) if sq_ref > 0 else 0.0,
+            'rel_Linf': linf/linf_ref if linf_ref > 0 else 0.0,
+            'peak_shift_samples': np.mean(shift), 'max_peak_shift_samples':
+            np.max(np.absolute(shift))}
+            
+            
+def compare(data_dir, suffix, ref_dir, ref_suffix=None, n=1024):
+    """
+    Compares two result sets artery by artery.
+    
+    Neither result set is loaded fully, the norms are accumulated over blocks
+    of n time steps.
+    
+    :param data_dir: Directory containing the results.
+    :param suffix: Suffix of the run.
+    :param ref_dir: Directory containing the reference results.
+    :param ref_suffix: Suffix of the reference run, defaults to suffix.
+    :param n: Number of time steps read at a time.
+    :returns: Dictionary mapping (artery, quantity) to error norms and the
+    mean and maximum shift of the peaks, counted in output samples.
+    """
+    if ref_suffix is None:
+        ref_suffix = suffix
+    report = {}
+    for pos in positions(ref_dir, ref_suffix):
+        for name in ['a', 'u', 'p']:
+            data = open_results(data_dir, name, pos, suffix)
+            ref = open_results(ref_dir, name, pos, ref_suffix)
+            report[(pos, name)] = compare_quantity(data, ref, n)
+    return report
+    
+    
+def format_report(report):
+    lines = ["%6s %2s %12s %12s %12s %12s %14s" % ('artery', 'q', 'L2', 'Linf',
+             'rel_L2', 'rel_Linf', 'shift[samples]')]
+    for key in sorted(report):
+        r = report[key]
+        lines.append("%6d %2s %12.4e %12.4e %12.4e %12.4e %14.2f" % (key[0],
+                     key[1], r['L2'], r['Linf'], r['rel_L2'], r['rel_Linf'],
+                     r['peak_shift_samples']))
+    return "\n".join(lines)
+    
+    
+def main(argv=None):
+    # usage: compare.py data_dir suffix ref_dir [ref_suffix]
+    if argv is None:
+        argv = sys.argv[1:]
+    if len(argv) < 3:
+        sys.stderr.write("usage: compare data_dir suffix ref_dir \
+[ref_suffix]\n")
+        return 1
+    report = compare(*argv[:4])
+    sys.stdout.write(format_report(report) + "\n")
+    return 0
+    
+    
+if __name__ == '__main__':
+    sys.exit(main())
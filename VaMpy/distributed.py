@@ -0,0 +1,434 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import division
+
+import sys
+import time
+import functools
+import multiprocessing
+import numpy as np
+
+from artery_network import ArteryNetwork
+from examples import example_network
+import utils
+
+try:
+    from mpi4py import MPI
+except ImportError:
+    MPI = None
+    
+    
+def partition(network, size):
+    """
+    Assigns the arteries of a network to ranks by subtrees.
+    
+    The arteries are split in depth first order into size parts with about
+    the same number of grid points, so every rank holds a few connected
+    subtrees and shares only the junctions at their roots with other ranks.
+    
+    :param network: Meshed ArteryNetwork.
+    :param size: Number of ranks.
+    :returns: List of the rank owning every artery.
+    """
+    arteries = network.arteries
+    order, stack = [], [0]
+    while len(stack) > 0:
+        pos = stack.pop()
+        order.append(pos)
+        stack.extend([d for d in [2*pos+2, 2*pos+1] if d < len(arteries)])
+    total = sum([artery.nx for artery in arteries])
+    owner = [0] * len(arteries)
+    done = 0
+    for pos in order:
+        # rank of the middle of the artery in the cumulative grid points
+        nx = arteries[pos].nx
+        owner[pos] = min(int(size*(done + nx/2)/total), size-1)
+        done += nx
+    return owner
+    
+    
+def halo(network, owner, rank):
+    """
+    Boundary columns a rank exchanges with its neighbours, these are the two
+    columns next to every junction shared with another rank.
+    
+    :param network: ArteryNetwork.
+    :param owner: List of the rank owning every artery.
+    :param rank: Rank.
+    :returns: Tuple of dicts mapping neighbouring ranks to the lists of
+    (pos, end) columns sent to and received from them, end is 0 for the inlet
+    and -1 for the outlet columns.
+    """
+    send, recv = {}, {}
+    leaves = len(network.arteries) - 2**(network.depth-1)
+    for p in range(leaves):
+        ends = [(p, -1), (2*p+1, 0), (2*p+2, 0)]
+        ranks = sorted(set(owner[pos] for pos, end in ends))
+        for pos, end in ends:
+            for r in ranks:
+                if r == owner[pos]:
+                    continue
+                if owner[pos] == rank:
+                    send.setdefault(r, []).append((pos, end))
+                elif r == rank:
+                    recv.setdefault(owner[pos], []).append((pos, end))
+    return send, recv
+    
+    
+class Request(object):
+    """
+    Class for pending messages of a PipeComm.
+    """
+    
+    
+    def __init__(self, conn=None):
+        self._conn = conn
+        
+        
+    def wait(self):
+        if self._conn is not None:
+            return self._conn.recv()
+            
+            
+class PipeComm(object):
+    """
+    Class exchanging messages between local processes through pipes, with
+    the part of the mpi4py communicator interface used by DistributedNetwork.
+    """
+    
+    
+    def __init__(self, rank, size, conns):
+        # conns[r] is the connection to rank r
+        self._rank = rank
+        self._size = size
+        self._conns = conns
+        
+        
+    @staticmethod
+    def pipes(size):
+        # connections of every rank to all other ranks
+        conns = [{} for r in range(size)]
+        for r in range(size):
+            for s in range(r+1, size):
+                conns[r][s], conns[s][r] = multiprocessing.Pipe()
+        return conns
+        
+        
+    def Get_rank(self):
+        return self._rank
+        
+        
+    def Get_size(self):
+        return self._size
+        
+        
+    def isend(self, obj, dest):
+        # blocking send, the pipe buffers the few boundary columns of a step
+        # so that all ranks can send before they receive
+        self._conns[dest].send(obj)
+        return Request()
+        
+        
+    def irecv(self, source):
+        return Request(self._conns[source])
+        
+        
+    def gather(self, obj, root=0):
+        if self._rank != root:
+            self._conns[root].send(obj)
+            return None
+        return [obj if r == root else self._conns[r].recv()
+                for r in range(self._size)]
+                
+                
+    def barrier(self):
+        if self.gather(None) is not None:
+            for r in self._conns:
+                self._conns[r].send(None)
+        else:
+            self._conns[0].recv()
+            
+            
+class DistributedNetwork(object):
+    """
+    Class advancing the arteries of a network owned by one rank. Only the
+    boundary columns next to junctions shared with other ranks are exchanged,
+    and only the owned arteries keep a time history.
+    """
+    
+    
+    def __init__(self, network, comm, owner=None):
+        # every rank holds the whole network, but only updates its arteries;
+        # comm is an mpi4py communicator or a PipeComm
+        if network.lts or network.params is not None or\
+           network.sampling is not None or network.symmetry or\
+           network.boundaries is not None:
+            raise ValueError("Distributed runs support neither local time \
+stepping, sensitivities, adaptive sampling, symmetric solves nor \
+characteristic boundaries.")
+        self._network = network
+        self._comm = comm
+        self._rank = comm.Get_rank()
+        if owner is None:
+            owner = partition(network, comm.Get_size())
+        self._owner = owner
+        self._arteries = [artery for artery in network.arteries
+                          if owner[artery.pos] == self._rank]
+        # the other arteries only provide the columns next to junctions,
+        # their histories are released before any output is written
+        for artery in network.arteries:
+            if owner[artery.pos] != self._rank:
+                artery.U = np.zeros((2, 0, artery.nx))
+                artery.P = np.zeros((0, artery.nx))
+        self._send, self._recv = halo(network, owner, self._rank)
+        self._lw = None
+        
+        
+    def columns(self, pos, end):
+        # view of the two columns of artery pos next to end
+        U0 = self._network.arteries[pos].U0
+        return U0[:,:2] if end == 0 else U0[:,-2:]
+        
+        
+    def exchange(self):
+        # posts the receives and sends of the boundary columns of this step
+        recvs = dict((r, self._comm.irecv(source=r)) for r in self._recv)
+        sends = [self._comm.isend(np.array([self.columns(pos, end)
+                                            for pos, end in self._send[r]]),
+                                  dest=r)
+                 for r in sorted(self._send)]
+        return recvs, sends
+        
+        
+    def step(self, q_in, save, i):
+        # advance the arteries of this rank from t-dt to t
+        network = self._network
+        t, dt = network.t, network.dt
+        leaves = len(network.arteries) - 2**(network.depth-1)
+        recvs, sends = self.exchange()
+        # the interior points only depend on U0, the boundary columns are
+        # overwritten once the neighbouring states have arrived; with an MPI
+        # communicator the messages may be in flight meanwhile, PipeComm has
+        # already sent them
+        U1 = [lw.solve(artery.U0, 0.0, 0.0, t, artery.F, artery.S, dt)
+              for lw, artery in zip(self._lw, self._arteries)]
+        for r in sorted(recvs):
+            for (pos, end), U in zip(self._recv[r], recvs[r].wait()):
+                self.columns(pos, end)[:] = U
+        for request in sends:
+            request.wait()
+        # junctions shared by several ranks are solved on each of them
+        junctions = {}
+        def junction(p):
+            if p not in junctions:
+                junctions[p] = network.bifurcation(network.arteries[p],
+                                                   network.arteries[2*p+1],
+                                                   network.arteries[2*p+2], dt)
+            return junctions[p]
+        for artery, U in zip(self._arteries, U1):
+            if artery.pos == 0:
+                in_t = utils.periodic(t, network.T) if network.T > 0 else t
+                U[:,0] = network.inlet_bc(artery, q_in, in_t, dt)
+            else:
+                U[:,0] = junction((artery.pos-1)//2)[2-artery.pos%2]
+            if artery.pos >= leaves:
+                U[:,-1] = network.outlet_bc(artery, dt, network.rc,
+                                            network.qc, network.rho)
+            else:
+                U[:,-1] = junction(artery.pos)[0]
+        for artery, U in zip(self._arteries, U1):
+            artery.update(U, t, dt, save, i)
+            if ArteryNetwork.cfl_condition(artery, dt) == False:
+                raise ValueError(
+                        "CFL condition not fulfilled at time %e. Reduce \
+time step size." % (t))
+                
+    
+    def run(self, q_in, history=True):
+        # generator advancing the arteries of this rank by one time step per
+        # iteration, all ranks need to iterate in lockstep
+        network = self._network
+        self._lw = [ArteryNetwork.schemes[network.scheme](artery.nx, artery.dx)
+                    for artery in self._arteries]
+        for save, i in network.schedule(history):
+            self.step(q_in, save, i)
+            yield network.t
+            
+            
+    def gather(self, root=0):
+        # copies the states and results of all arteries to the network of
+        # root, which is returned on root and None on the other ranks
+        data = [(artery.pos, artery.U0, artery.P, artery.U)
+                for artery in self._arteries]
+        data = self._comm.gather(data, root=root)
+        if data is None:
+            return None
+        for pos, U0, P, U in sum(data, []):
+            artery = self._network.arteries[pos]
+            np.copyto(artery.U0, U0)
+            artery.P, artery.U = P, U
+        return self._network
+        
+        
+    @property
+    def owner(self):
+        return self._owner
+        
+    @property
+    def arteries(self):
+        return self._arteries
+        
+    @property
+    def network(self):
+        return self._network
+        
+        
+def run_rank(factory, q_in, comm, history=True):
+    """
+    Runs the part of a network owned by the rank of a communicator.
+    
+    :param factory: Function without arguments returning the network with
+    initial conditions and time set, it is called on every rank.
+    :param q_in: Inlet flow function.
+    :param comm: mpi4py communicator or PipeComm.
+    :param history: Store the results at the output times.
+    :returns: Tuple of the network holding all results on rank 0 (None on
+    the other ranks) and the wall time of the time loop.
+    """
+    dn = DistributedNetwork(factory(), comm)
+    comm.barrier()
+    start = time.time()
+    for t in dn.run(q_in, history):
+        pass
+    comm.barrier()
+    wall = time.time() - start
+    return dn.gather(), wall
+    
+    
+def _worker(factory, q_in, history, rank, conns):
+    # keep only the pipe ends of this rank open, so that the other ranks see
+    # the pipes close if this one fails
+    for r in range(len(conns)):
+        if r != rank:
+            for conn in conns[r].values():
+                conn.close()
+    run_rank(factory, q_in, PipeComm(rank, len(conns), conns[rank]), history)
+    
+    
+def solve(factory, q_in, size=2, history=True):
+    """
+    Runs a network distributed over MPI ranks when started with more than
+    one rank by mpirun, otherwise over size local processes.
+    
+    Rank 0 runs in the calling process, factory and q_in do not need to be
+    picklable as the local processes are forked.
+    
+    :param factory: Function without arguments returning the network with
+    initial conditions and time set.
+    :param q_in: Inlet flow function.
+    :param size: Number of local processes.
+    :param history: Store the results at the output times.
+    :returns: Tuple of the network holding all results on rank 0 (None on
+    the other ranks) and the wall time of the time loop.
+    """
+    if MPI is not None and MPI.COMM_WORLD.Get_size() > 1:
+        return run_rank(factory, q_in, MPI.COMM_WORLD, history)
+    conns = PipeComm.pipes(size)
+    workers = [multiprocessing.Process(target=_worker,
+                                       args=(factory, q_in, history, r, conns))
+               for r in range(1, size)]
+    for worker in workers:
+        worker.start()
+    for r in range(1, size):
+        for conn in conns[r].values():
+            conn.close()
+    try:
+        result = run_rank(factory, q_in, PipeComm(0, size, conns[0]), history)
+    except:
+        for worker in workers:
+            worker.terminate()
+        raise
+    finally:
+        for worker in workers:
+            worker.join()
+    return result
+    
+    
+def benchmark_network(depth, nx, steps=100, cfl=0.5):
+    """
+    Symmetric network used by the scaling benchmark.
+    
+    :param depth: Depth of the tree.
+    :param nx: Number of grid points per artery.
+    :param steps: Number of time steps.
+    :param cfl: Courant number of the time step.
+    :returns: ArteryNetwork with initial conditions and time set.
+    """
+    network = example_network(depth, nx)
+    dt = min([ArteryNetwork.stable_dt(artery, cfl)
+              for artery in network.arteries])
+    # run stops before a step ending within rounding of tf
+    network.set_time((steps + 0.5)*dt, dt, 1.0)
+    return network
+    
+    
+def benchmark_flow(t):
+    return 0.5 + 0.2*np.sin(2*np.pi*t)
+    
+    
+def scaling(sizes=(1, 2, 4), depth=5, nx=201, steps=100, weak=False):
+    """
+    Wall times of the time loop for increasing numbers of ranks.
+    
+    For strong scaling the network is fixed, for weak scaling it grows by one
+    level per doubling of the ranks. Under mpirun only the size of the MPI
+    communicator is run.
+    
+    :param sizes: Numbers of ranks.
+    :param depth: Depth of the network on one rank.
+    :param nx: Number of grid points per artery.
+    :param steps: Number of time steps.
+    :param weak: Weak instead of strong scaling.
+    :returns: List of tuples (ranks, depth, grid points, wall time).
+    """
+    if MPI is not None and MPI.COMM_WORLD.Get_size() > 1:
+        sizes = [MPI.COMM_WORLD.Get_size()]
+    results = []
+    for size in sizes:
+        d = depth + int(np.log2(size)) if weak else depth
+        factory = functools.partial(benchmark_network, d, nx, steps)
+        network, wall = solve(factory, benchmark_flow, size, history=False)
+        results.append((size, d, (2**d-1)*nx, wall))
+    return results
+    
+    
+def main(argv=None):
+    # usage: vampy-scaling [strong|weak] [depth] [nx] [ranks ...]
+    if argv is None:
+        argv = sys.argv[1:]
+    mode = argv[0] if len(argv) > 0 else 'strong'
+    if mode not in ['strong', 'weak']:
+        sys.stderr.write("usage: vampy-scaling [strong|weak] [depth] [nx] \
+[ranks ...]\n")
+        return 1
+    depth = int(argv[1]) if len(argv) > 1 else 5
+    nx = int(argv[2]) if len(argv) > 2 else 201
+    sizes = [int(s) for s in argv[3:]] or [1, 2, 4]
+    results = scaling(sizes, depth, nx, weak=(mode == 'weak'))
+    if MPI is not None and MPI.COMM_WORLD.Get_rank() != 0:
+        return 0
+    base = results[0][3] * (1 if mode == 'weak' else results[0][0])
+    sys.stdout.write("ranks depth points wall[s] efficiency\n")
+    for size, d, points, wall in results:
+        if mode == 'strong':
+            efficiency = base / (size*wall)
+        else:
+            efficiency = base / wall
+        sys.stdout.write("%5d %5d %6d %7.3f %10.2f\n" % (size, d, points,
+                                                          wall, efficiency))
+    return 0
+    
+    
+if __name__ == '__main__':
+    sys.exit(main())
+    
\ No newline at end of file
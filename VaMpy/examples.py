@@ -0,0 +1,36 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import division
+
+import numpy as np
+
+from artery_network import ArteryNetwork
+
+
+# wall stiffness parameters of the example networks
+K = (1.89e5, -22.53, 8160.0)
+
+
+def example_network(depth, nx, u0=0.5, history=True, R=0.37, **kwargs):
+    """
+    Symmetric network of untapered vessels used by the benchmarks, the
+    reference problems and the tests.
+    
+    :param depth: Depth of the tree.
+    :param nx: Number of grid points per artery.
+    :param u0: Initial flow.
+    :param history: Allocate the time history of the ntr output times.
+    :param R: Radius of the root vessel.
+    :param kwargs: Keyword arguments of ArteryNetwork replacing the defaults
+    ntr=10, nondim=[1.0, 10.0, 217.4] and k=K, e.g. friction.
+    :returns: Meshed ArteryNetwork with initial conditions and without time
+    settings.
+    """
+    args = {'ntr': 10, 'nondim': [1.0, 10.0, 217.4], 'k': K}
+    args.update(kwargs)
+    network = ArteryNetwork(np.linspace(R, R, 20), 0.91, 0.7, 50, 1.06,
+                            0.046, 0.1, depth, **args)
+    network.mesh(nx)
+    network.initial_conditions(u0, None if history else 0)
+    return network
+    
\ No newline at end of file
@@ -0,0 +1,155 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import division
+
+import numpy as np
+
+from artery_network import ArteryNetwork
+
+
+def sinhc(x):
+    # sinh(x)/x with the limit 1 at x = 0
+    out = np.ones(x.shape, dtype=complex)
+    nz = x != 0
+    out[nz] = np.sinh(x[nz]) / x[nz]
+    return out
+    
+    
+class FrequencyDomain(object):
+    """
+    Class solving the linearised equations of a meshed network in the
+    frequency domain for a periodic inlet flow.
+    """
+    
+    
+    def __init__(self, network, T, nh=10):
+        # harmonics 0 to nh of period T, every grid cell of an artery is a
+        # uniform transmission line segment
+        self._network = network
+        self._T = T
+        self._omega = 2*np.pi*np.arange(nh+1)/T
+        self._Z = [None] * len(network.arteries)
+        self._M = [None] * len(network.arteries)
+        self._P = None
+        self._Q = None
+        self.impedances()
+        
+        
+    def segments(self, artery):
+        # transfer matrices of the cells of artery for all harmonics, shape
+        # (4, harmonics, cells) holding M11, M12, M21, M22
+        A0 = (artery.A0[1:] + artery.A0[:-1])/2
+        r = np.sqrt(A0/np.pi)
+        w = self._omega[:,None]
+        z = 2*np.pi*r/(artery.Re*artery.delta*A0**2) + 1j*w/A0
+        y = 1j*w * 2*A0/artery.f
+        gl = np.sqrt(z*y) * artery.dx
+        s = sinhc(gl)
+        return np.array([np.cosh(gl), z*artery.dx*s, y*artery.dx*s,
+                         np.cosh(gl)])
+        
+        
+    def outlet_impedance(self, artery):
+        network = self._network
+        if artery.windkessel is not None:
+            R1, R2, Ct = artery.windkessel
+        else:
+            R1, R2, Ct = ArteryNetwork.windkessel(network.rc, network.qc,
+                                                  network.rho)
+        return R1 + R2/(1 + 1j*self._omega*R2*Ct)
+        
+        
+    def impedances(self):
+        # input impedance at every grid point, from the outlets to the root
+        arteries = self._network.arteries
+        leaves = len(arteries) - 2**(self._network.depth-1)
+        for artery in reversed(arteries):
+            if artery.pos >= leaves:
+                ZL = self.outlet_impedance(artery)
+            else:
+                ZL = 1/(1/self._Z[2*artery.pos+1][:,0] +
+                        1/self._Z[2*artery.pos+2][:,0])
+            M = self.segments(artery)
+            Z = np.zeros((len(self._omega), artery.nx), dtype=complex)
+            Z[:,-1] = ZL
+            for j in range(artery.nx-2, -1, -1):
+                Zj = Z[:,j+1]
+                Z[:,j] = (M[0,:,j]*Zj + M[1,:,j]) /\
+                         (M[2,:,j]*Zj + M[3,:,j])
+            self._Z[artery.pos] = Z
+            self._M[artery.pos] = M
+            
+            
+    def harmonics(self, q_in, n=None):
+        # Fourier coefficients of the inlet flow sampled at n points
+        if n is None:
+            n = max(256, 4*len(self._omega))
+        t = np.arange(n) * self._T / n
+        return np.fft.rfft([q_in(ti) for ti in t])[:len(self._omega)] / n
+        
+        
+    def solve(self, q_in, nt=100):
+        # pressure and flow time series at nt points of one period in every
+        # artery, shape (nt, nx)
+        Qh = self.harmonics(q_in)
+        Ph = [None] * len(self._Z)
+        Qa = [None] * len(self._Z)
+        for artery in self._network.arteries:
+            Z, M = self._Z[artery.pos], self._M[artery.pos]
+            P = np.zeros(Z.shape, dtype=complex)
+            if artery.pos == 0:
+                P[:,0] = Z[:,0] * Qh
+            else:
+                P[:,0] = Ph[(artery.pos-1)//2][:,-1]
+            for j in range(artery.nx-1):
+                P[:,j+1] = P[:,j] / (M[0,:,j] + M[1,:,j]/Z[:,j+1])
+            Ph[artery.pos] = P
+            Qa[artery.pos] = P / Z
+        self._P = [self.synthesise(P, nt) for P in Ph]
+        self._Q = [self.synthesise(Q, nt) for Q in Qa]
+        return self._P, self._Q
+        
+        
+    def synthesise(self, X, nt):
+        # time series from the one-sided Fourier coefficients X
+        t = np.arange(nt) * self._T / nt
+        e = np.exp(1j*np.outer(t, self._omega))
+        e[:,1:] *= 2
+        return np.real(np.dot(e, X))
+        
+        
+    def initial_conditions(self, network=None):
+        # sets U0 of network (defaults to the solved network) to the linear
+        # solution at the start of the period; call after solve
+        if network is None:
+            network = self._network
+        for artery in network.arteries:
+            p = self._P[artery.pos][0]
+            q = self._Q[artery.pos][0]
+            x = np.linspace(0.0, 1.0, artery.nx)
+            xc = np.linspace(0.0, 1.0, len(p))
+            p, q = np.interp(x, xc, p), np.interp(x, xc, q)
+            artery.U0[0,:] = artery.A0 / (1 - p/artery.f)**2
+            artery.U0[1,:] = q
+            
+            
+    @property
+    def input_impedance(self):
+        return self._Z[0][:,0]
+        
+    @property
+    def omega(self):
+        return self._omega
+        
+    @property
+    def Z(self):
+        return self._Z
+        
+    @property
+    def P(self):
+        return self._P
+        
+    @property
+    def Q(self):
+        return self._Q
+        
\ No newline at end of file
@@ -0,0 +1,324 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import division
+
+import os
+import sys
+import time
+import tempfile
+import multiprocessing
+from multiprocessing.connection import Listener, Client
+import numpy as np
+from scipy.interpolate import interp1d
+
+from artery_network import ArteryNetwork
+import utils
+
+
+# connections unpickle every message, so the server only listens on a unix
+# socket in a directory private to the user and checks a random key
+# written next to it that only the user can read
+RUNTIME = os.environ.get('VAMPY_RUNTIME', os.path.join(tempfile.gettempdir(),
+                                                       'vampy-%d' % os.getuid()))
+
+# parsed inputs of every worker process, keyed by file name and mtime
+_inputs = {}
+
+
+def read_inputs(fname):
+    """
+    Reads a configuration file and its inlet waveform, cached per process.
+    
+    :param fname: Filename of the configuration file.
+    :returns: Tuple of the Files, Arteries and Simulation sections and the
+    inlet data (u, t).
+    """
+    fname = os.path.abspath(fname)
+    key = (fname, os.path.getmtime(fname))
+    if key not in _inputs:
+        files, arteries, sim = utils.read_config(fname)
+        inlet = os.path.join(os.path.dirname(fname), files['inlet'])
+        _inputs[key] = (files, arteries, sim, utils.read_csv(inlet, sim['T']))
+    files, arteries, sim, inlet = _inputs[key]
+    return dict(files), dict(arteries), dict(sim), inlet
+    
+    
+def build(arteries, sim, inlet, history=True, storage=None):
+    """
+    Sets up a network and its nondimensional inlet flow from configuration
+    sections in cgs units.
+    
+    Arteries: R, a, b, depth and optionally Rd, lam, k1, k2, k3. Simulation:
+    T, dt, nx and optionally tc, ntr, rc, qc, rho, nu.
+    
+    :param arteries: Arteries section returned by utils.read_config.
+    :param sim: Simulation section returned by utils.read_config.
+    :param inlet: Inlet flow data returned by utils.read_csv.
+    :param history: Allocate the time history of the results.
+    :param storage: Directory for memory-mapped time histories.
+    :returns: Tuple of the network, the inlet flow function and the
+    nondimensional period.
+    """
+    rc, qc = sim.get('rc', 1.0), sim.get('qc', 10.0)
+    rho, nu = sim.get('rho', 1.06), sim.get('nu', 0.046)
+    Re = qc/(nu*rc)
+    tc = rc**3/qc
+    T = sim['T']/tc
+    k = (arteries.get('k1', 2e7)*rc/(rho*qc**2), arteries.get('k2', -22.53)*rc,
+         arteries.get('k3', 8.65e5)*rc/(rho*qc**2))
+    delta = np.sqrt(nu*sim['T']/(2*np.pi))/rc
+    nx = sim['nx']
+    R = np.linspace(arteries['R'], arteries.get('Rd', arteries['R']), nx)/rc
+    network = ArteryNetwork(R, arteries['a'], arteries['b'],
+                            arteries.get('lam', 50), rho, nu, delta,
+                            int(arteries['depth']), ntr=sim.get('ntr', 100),
+                            nondim=[rc, qc, Re], k=k)
+    network.mesh(nx)
+    u, t = inlet
+    q_in = interp1d(np.array(t)/tc, np.array(u)/qc)
+    network.initial_conditions(u[0]/qc, None if history else 0,
+                               storage=storage)
+    network.set_time(sim.get('tc', 1)*T, sim['dt']/tc, T)
+    return network, q_in, T
+    
+    
+def run_job(spec):
+    """
+    Runs a simulation job in a worker process.
+    
+    :param spec: Dictionary with the configuration file 'config' and
+    optionally 'overrides' (section name mapped to values), 'data_dir',
+    'suffix', 'fmt' and 'storage' (directory for memory-mapped time
+    histories).
+    :returns: List of the result files.
+    """
+    files, arteries, sim, inlet = read_inputs(spec['config'])
+    overrides = spec.get('overrides', {})
+    arteries.update(overrides.get('Arteries', {}))
+    sim.update(overrides.get('Simulation', {}))
+    network, q_in, T = build(arteries, sim, inlet,
+                             storage=spec.get('storage'))
+    network.solve(q_in, 0, T)
+    data_dir = spec.get('data_dir', os.path.dirname(os.path.abspath(
+                                                            spec['config'])))
+    suffix = spec.get('suffix', 'job')
+    fmt = spec.get('fmt', 'csv')
+    if not os.path.exists(data_dir):
+        os.makedirs(data_dir)
+    network.dump_results(suffix, data_dir, fmt)
+    return ["%s/%s%d_%s.%s" % (data_dir, name, artery.pos, suffix, fmt)
+            for artery in network.arteries for name in ['u', 'a', 'p']]
+    
+    
+def runtime_dir():
+    # per-user directory of the socket and the key, created with mode 0700
+    if not os.path.isdir(RUNTIME):
+        os.makedirs(RUNTIME, 0o700)
+    st = os.stat(RUNTIME)
+    if st.st_uid != os.getuid() or st.st_mode & 0o077:
+        raise IOError("Runtime directory %s is accessible by other users." %
+                      (RUNTIME))
+    return RUNTIME
+    
+    
+def default_address():
+    return os.path.join(runtime_dir(), 'jobs.sock')
+    
+    
+def key_file(address):
+    # file holding the authentication key of the server at address
+    if isinstance(address, tuple):
+        return os.path.join(runtime_dir(), 'jobs-%s-%d.key' % address)
+    return address + '.key'
+    
+    
+def write_key(address):
+    # new random key, readable by the user only
+    authkey = os.urandom(32)
+    fname = key_file(address)
+    fd = os.open(fname, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    try:
+        os.fchmod(fd, 0o600)
+        os.write(fd, authkey)
+    finally:
+        os.close(fd)
+    return authkey
+    
+    
+def read_key(address):
+    with open(key_file(address), 'rb') as f:
+        return f.read()
+        
+        
+class JobServer(object):
+    """
+    Class serving simulation jobs to a pool of worker processes that have
+    imported the package once.
+    """
+    
+    
+    def __init__(self, address=None, processes=None, authkey=None):
+        # address defaults to a unix socket in runtime_dir, authkey to a
+        # random key written to key_file(address)
+        if address is None:
+            address = default_address()
+        if authkey is None:
+            authkey = write_key(address)
+        self._address = address
+        self._authkey = authkey
+        self._pool = multiprocessing.Pool(processes)
+        self._jobs = {}
+        self._submitted = 0
+        if not isinstance(address, tuple) and os.path.exists(address):
+            # socket left behind by a server that did not shut down
+            os.unlink(address)
+        # clients can connect as soon as the server exists
+        self._listener = Listener(address, authkey=authkey)
+        
+        
+    def handle(self, msg):
+        # reply to a single request
+        if not isinstance(msg, dict):
+            return {'state': 'error', 'error': "Request is not a dict."}
+        cmd = msg.get('cmd')
+        if cmd == 'submit':
+            if not isinstance(msg.get('job'), dict):
+                return {'state': 'error', 'error': "Job is not a dict."}
+            job_id = self._submitted
+            self._submitted += 1
+            self._jobs[job_id] = self._pool.apply_async(run_job,
+                                                        (msg['job'],))
+            return {'id': job_id}
+        elif cmd == 'status':
+            if not isinstance(msg.get('id'), int):
+                return {'state': 'error', 'error': "Job id is not an int."}
+            job = self._jobs.get(msg['id'])
+            if job is None:
+                return {'state': 'unknown'}
+            if not job.ready():
+                return {'state': 'running'}
+            # results are only kept until they have been fetched
+            del self._jobs[msg['id']]
+            try:
+                return {'state': 'done', 'result': job.get()}
+            except Exception as e:
+                return {'state': 'failed', 'error': repr(e)}
+        elif cmd == 'shutdown':
+            return {'state': 'shutdown'}
+        return {'state': 'error', 'error': "Unknown command %s." % (cmd)}
+        
+        
+    def serve(self):
+        # handle requests until a shutdown request arrives
+        listener = self._listener
+        try:
+            while True:
+                try:
+                    conn = listener.accept()
+                except multiprocessing.AuthenticationError:
+                    # client without the key, its connection is closed
+                    continue
+                reply = {}
+                try:
+                    # a bad request only fails its own connection
+                    reply = self.handle(conn.recv())
+                    conn.send(reply)
+                except EOFError:
+                    # client disconnected before sending a request
+                    pass
+                except Exception as e:
+                    reply = {'state': 'error', 'error': repr(e)}
+                    try:
+                        conn.send(reply)
+                    except Exception:
+                        pass
+                finally:
+                    conn.close()
+                if reply.get('state') == 'shutdown':
+                    break
+        finally:
+            listener.close()
+            self._pool.close()
+            self._pool.join()
+            
+            
+    @property
+    def address(self):
+        return self._address
+        
+    @property
+    def jobs(self):
+        return self._jobs
+        
+        
+def request(msg, address=None, authkey=None):
+    # address and authkey default to those of a JobServer with defaults
+    if address is None:
+        address = default_address()
+    if authkey is None:
+        authkey = read_key(address)
+    conn = Client(address, authkey=authkey)
+    try:
+        conn.send(msg)
+        return conn.recv()
+    finally:
+        conn.close()
+        
+        
+def submit(job, address=None, authkey=None):
+    return request({'cmd': 'submit', 'job': job}, address, authkey)['id']
+    
+    
+def wait(job_id, address=None, authkey=None, poll=0.1):
+    # poll the server until the job has finished
+    while True:
+        reply = request({'cmd': 'status', 'id': job_id}, address, authkey)
+        if reply['state'] != 'running':
+            return reply
+        time.sleep(poll)
+        
+        
+def main(argv=None):
+    # usage: vampy-jobs serve [processes]
+    #        vampy-jobs submit config [suffix] [data_dir]
+    #        vampy-jobs wait id | status id | shutdown
+    if argv is None:
+        argv = sys.argv[1:]
+    usage = "usage: vampy-jobs serve [processes] | submit config [suffix] \
+[data_dir] | wait id | status id | shutdown\n"
+    if len(argv) < 1:
+        sys.stderr.write(usage)
+        return 1
+    cmd = argv[0]
+    if cmd == 'serve':
+        processes = int(argv[1]) if len(argv) > 1 else None
+        JobServer(processes=processes).serve()
+    elif cmd == 'submit' and len(argv) > 1:
+        job = {'config': os.path.abspath(argv[1])}
+        if len(argv) > 2:
+            job['suffix'] = argv[2]
+        if len(argv) > 3:
+            job['data_dir'] = os.path.abspath(argv[3])
+        sys.stdout.write("%d\n" % (submit(job)))
+    elif cmd in ['wait', 'status'] and len(argv) > 1:
+        if cmd == 'wait':
+            reply = wait(int(argv[1]))
+        else:
+            reply = request({'cmd': 'status', 'id': int(argv[1])})
+        if reply['state'] == 'done':
+            sys.stdout.write("\n".join(reply['result']) + "\n")
+        else:
+            sys.stdout.write("%s %s\n" % (reply['state'],
+                                          reply.get('error', '')))
+            return 0 if reply['state'] == 'running' else 1
+    elif cmd == 'shutdown':
+        request({'cmd': 'shutdown'})
+    else:
+        sys.stderr.write(usage)
+        return 1
+    return 0
+    
+    
+if __name__ == '__main__':
+    sys.exit(main())
+    
\ No newline at end of file
@@ -40,6 +40,50 @@ class LaxWendroff(object):
         return U1
         
         
+    def solve_tangent(self, U0, dU0, U_in, U_out, dU_in, dU_out, t, F, S, dF,
+                      dS, dt, ddx):
+        # time step together with its tangent linearisation, the tangents
+        # have a trailing axis of sensitivity parameters and ddx is the
+        # tangent of the grid spacing
+        nx = self.nx
+        dx = self.dx
+        U1 = np.zeros((2,nx))
+        dU1 = np.zeros((2,nx,len(ddx)))
+        # apply boundary conditions
+        U1[:,0] = U_in
+        U1[:,-1] = U_out
+        dU1[:,0] = dU_in
+        dU1[:,-1] = dU_out
+        # calculate half step
+        Ur, Uc, Ul = U0[:,2:], U0[:,1:-1], U0[:,0:-2]
+        dUr, dUc, dUl = dU0[:,2:], dU0[:,1:-1], dU0[:,0:-2]
+        F2, F1, F0 = F(Ur, j=2, k=nx), F(Uc, j=1, k=-1), F(Ul, j=0, k=-2)
+        S2, S1, S0 = S(Ur, j=2, k=nx), S(Uc, j=1, k=-1), S(Ul, j=0, k=-2)
+        dF2 = dF(Ur, dUr, j=2, k=nx)
+        dF1 = dF(Uc, dUc, j=1, k=-1)
+        dF0 = dF(Ul, dUl, j=0, k=-2)
+        dS2 = dS(Ur, dUr, j=2, k=nx)
+        dS1 = dS(Uc, dUc, j=1, k=-1)
+        dS0 = dS(Ul, dUl, j=0, k=-2)
+        U_np_mp = (Ur+Uc)/2 - dt*(F2-F1)/(2*dx) + dt*(S2+S1)/4
+        U_np_mm = (Uc+Ul)/2 - dt*(F1-F0)/(2*dx) + dt*(S1+S0)/4
+        dU_np_mp = (dUr+dUc)/2 - dt*(dF2-dF1)/(2*dx) +\
+                    dt*(F2-F1)[...,None]*ddx/(2*dx*dx) + dt*(dS2+dS1)/4
+        dU_np_mm = (dUc+dUl)/2 - dt*(dF1-dF0)/(2*dx) +\
+                    dt*(F1-F0)[...,None]*ddx/(2*dx*dx) + dt*(dS1+dS0)/4
+        # full step
+        Fp, Fm = F(U_np_mp, j=1, k=-1), F(U_np_mm, j=1, k=-1)
+        Sp, Sm = S(U_np_mp, j=1, k=-1), S(U_np_mm, j=1, k=-1)
+        dFp = dF(U_np_mp, dU_np_mp, j=1, k=-1)
+        dFm = dF(U_np_mm, dU_np_mm, j=1, k=-1)
+        dSp = dS(U_np_mp, dU_np_mp, j=1, k=-1)
+        dSm = dS(U_np_mm, dU_np_mm, j=1, k=-1)
+        U1[:,1:-1] = Uc - dt*(Fp-Fm)/dx + dt*(Sp+Sm)/2
+        dU1[:,1:-1] = dUc - dt*(dFp-dFm)/dx +\
+                    dt*(Fp-Fm)[...,None]*ddx/(dx*dx) + dt*(dSp+dSm)/2
+        return U1, dU1
+        
+        
     @property   
     def nx(self):
         return self._nx
@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import division
+
+import numpy as np
+
+
+class MusclHancock(object):
+    """
+    Class implementing the MUSCL-Hancock finite volume method with limited
+    linear reconstruction and a local Lax-Friedrichs flux.
+    """
+    
+    
+    def __init__(self, nx, dx):
+        self._nx = int(nx)
+        self._dx = dx
+        
+        
+    @staticmethod
+    def limiter(dl, dr):
+        # monotonised central slope
+        s = np.sign(dl)
+        return np.where(dl*dr > 0, s * np.minimum(np.absolute(dl+dr)/2,
+                        2*np.minimum(np.absolute(dl), np.absolute(dr))), 0.0)
+                        
+                        
+    @staticmethod
+    def speed(U, FU):
+        # |u| + c of the blood flow equations from the flux FU = F(U); the
+        # pressure term f sqrt(a0 a) of the tube law has the derivative
+        # c^2 = f sqrt(a0 a) / (2a)
+        a, q = U
+        u = q/a
+        return np.absolute(u) + np.sqrt((FU[1] - q*u) / (2*a))
+        
+        
+    def solve(self, U0, U_in, U_out, t, F, S, dt):
+        # U0: previous timestep, U1 current timestep
+        nx = self.nx
+        dx = self.dx
+        U1 = np.zeros((2,nx))
+        # apply boundary conditions
+        U1[:,0] = U_in
+        U1[:,-1] = U_out
+        # limited slopes, ghost cells extrapolate the boundary values
+        # linearly so that the faces next to the boundaries are second order
+        # accurate as well
+        G = np.concatenate((2*U0[:,:1] - U0[:,1:2], U0,
+                            2*U0[:,-1:] - U0[:,-2:-1]), axis=1)
+        d = self.limiter(G[:,1:-1]-G[:,:-2], G[:,2:]-G[:,1:-1])
+        # evolve the cell face values by half a time step
+        UL, UR = U0 - d/2, U0 + d/2
+        dU = dt/(2*dx) * (F(UL) - F(UR)) + dt/2 * S(U0)
+        UL += dU
+        UR += dU
+        # fluxes at the faces between the cells
+        Ul, Ur = UR[:,:-1], UL[:,1:]
+        Fl, Fr = F(Ul, j=0, k=-1), F(Ur, j=1, k=nx)
+        s = np.maximum(self.speed(Ul, Fl), self.speed(Ur, Fr))
+        flux = (Fl + Fr)/2 - s*(Ur - Ul)/2
+        U1[:,1:-1] = U0[:,1:-1] - dt*(flux[:,1:] - flux[:,:-1])/dx +\
+                    dt*S((U0 + dU)[:,1:-1], j=1, k=-1)
+        return U1
+        
+        
+    @property
+    def nx(self):
+        return self._nx
+        
+    @property
+    def dx(self):
+        return self._dx
+        
\ No newline at end of file
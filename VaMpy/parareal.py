@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import division
+
+import multiprocessing
+import numpy as np
+
+from warm_start import get_state, set_state
+
+
+def propagate(args):
+    # advances a state by one period on the grid nx, T needs to be a multiple
+    # of dt; module level so that it can be sent to worker processes
+    factory, q_in, nx, dt, T, state = args
+    network = factory(nx)
+    set_state(network, state)
+    # run stops before a step ending within rounding of tf
+    network.set_time(T + dt/2, dt, T)
+    for t in network.run(q_in, history=False):
+        pass
+    return get_state(network)
+    
+    
+class Parareal(object):
+    """
+    Class integrating a network over many periods with the parareal method,
+    running the fine propagator of every period in parallel.
+    """
+    
+    
+    def __init__(self, factory, q_in, T, cycles, nx, dt, coarse_nx,
+                 coarse_dt, tol=1e-6, max_iter=None):
+        # factory(nx) returns a meshed network with initial conditions, the
+        # time slices are whole periods so every slice starts at the same
+        # phase of the inlet; factory and q_in need to be picklable. The
+        # iteration converges fastest if the coarse propagator mainly
+        # coarsens dt, coarse grids add phase errors to the waves
+        self._factory = factory
+        self._q_in = q_in
+        self._T = T
+        self._cycles = cycles
+        self._nx = nx
+        self._dt = dt
+        self._coarse_nx = coarse_nx
+        self._coarse_dt = coarse_dt
+        self._tol = tol
+        self._max_iter = cycles if max_iter is None else max_iter
+        self._fine = factory(nx)
+        self._states = None
+        self._residuals = []
+        
+        
+    def fine_grid(self, state):
+        # state interpolated onto the fine grid
+        set_state(self._fine, state)
+        return get_state(self._fine)
+        
+        
+    def coarse(self, state):
+        return self.fine_grid(propagate((self._factory, self._q_in,
+                        self._coarse_nx, self._coarse_dt, self._T, state)))
+        
+        
+    def residual(self, new, old):
+        # largest change of the states relative to their magnitude
+        return max([np.max(np.max(np.absolute(new[key] - old[key]), axis=1) /
+                           np.max(np.absolute(old[key]), axis=1))
+                    for key in new if key.startswith('U')])
+        
+        
+    def run(self, processes=None):
+        # returns the fine grid states at the start of every period and at
+        # the end of the last one
+        N = self._cycles
+        U = [get_state(self._fine)]
+        G = []
+        for n in range(N):
+            G.append(self.coarse(U[n]))
+            U.append(G[n])
+        pool = None if processes == 1 else multiprocessing.Pool(processes)
+        try:
+            for k in range(self._max_iter):
+                # slices before k are exact after k iterations
+                args = [(self._factory, self._q_in, self._nx, self._dt,
+                         self._T, U[n]) for n in range(k, N)]
+                if pool is None:
+                    F = map(propagate, args)
+                else:
+                    F = pool.map(propagate, args)
+                U_new = U[:k+1]
+                U_new.append(F[0])
+                for n in range(k+1, N):
+                    g = self.coarse(U_new[n])
+                    U_new.append(dict((key, g[key] + F[n-k][key] -
+                                       G[n][key] if key.startswith('U') or
+                                       key == 'Pc' else g[key]) for key in g))
+                    G[n] = g
+                residual = max([self.residual(U_new[n], U[n])
+                                for n in range(k+1, N+1)])
+                self._residuals.append(residual)
+                U = U_new
+                if residual < self._tol:
+                    break
+        finally:
+            if pool is not None:
+                pool.close()
+                pool.join()
+        self._states = U
+        return U
+        
+        
+    @property
+    def states(self):
+        return self._states
+        
+    @property
+    def residuals(self):
+        return self._residuals
+        
+    @property
+    def iterations(self):
+        return len(self._residuals)
+        
+    @property
+    def cycles(self):
+        return self._cycles
+        
\ No newline at end of file
@@ -0,0 +1,132 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import division
+
+import sys
+import time
+import numpy as np
+
+from artery_network import ArteryNetwork
+from job_server import read_inputs, build
+
+
+# float64 arrays of nx values per artery besides the time history: U0, the
+# geometry and the temporaries of a Lax-Wendroff step
+STATE_ARRAYS = 16
+
+
+def footprint(network, ntr):
+    """
+    Memory of a run in bytes.
+    
+    :param network: Meshed ArteryNetwork.
+    :param ntr: Number of stored output times.
+    :returns: Tuple of the bytes of the time history, which holds U and P of
+    shape (3, ntr, nx) for every artery, and of the remaining state.
+    """
+    cells = sum([artery.nx for artery in network.arteries])
+    return 3*ntr*cells*8, STATE_ARRAYS*cells*8
+    
+    
+def step_time(network, q_in, steps=20):
+    """
+    Wall time per time step measured by a short run.
+    
+    :param network: ArteryNetwork with initial conditions and time set, it is
+    advanced by the given number of steps.
+    :param q_in: Inlet flow function.
+    :param steps: Number of time steps.
+    :returns: Wall time per step in seconds.
+    """
+    network.set_time(network.t + (steps+0.5)*network.dt, network.dt,
+                     network.T, lts=network.lts, scheme=network.scheme)
+    start = time.time()
+    for t in network.run(q_in, history=False):
+        pass
+    return (time.time() - start) / steps
+    
+    
+def plan(fname, budget=None, fit='decimate', cfl=0.9, steps=20):
+    """
+    Predicts the cost of the run set up by a configuration file without
+    allocating its results.
+    
+    If the run does not fit into budget, the time history is either stored
+    in memory-mapped files (fit='memmap') or the number of output times ntr
+    is reduced (fit='decimate').
+    
+    :param fname: Filename of the configuration file.
+    :param budget: Memory budget in bytes.
+    :param fit: 'decimate' or 'memmap'.
+    :param cfl: Courant number of the stable time step.
+    :param steps: Number of time steps of the calibration run, 0 skips it.
+    It is skipped as well if dt exceeds the stable time step.
+    :returns: Dictionary with the number of arteries and grid points, the
+    time step dt and the stable time step at the initial conditions, the
+    number of steps, ntr, the storage ('memory' or 'memmap'), the memory and
+    disk usage in bytes and the runtime in seconds.
+    """
+    if fit not in ['decimate', 'memmap']:
+        raise ValueError("Unknown fit %s." % (fit))
+    files, arteries, sim, inlet = read_inputs(fname)
+    network, q_in, T = build(arteries, sim, inlet, history=False)
+    ntr = network.ntr
+    history, state = footprint(network, ntr)
+    storage = 'memory'
+    if budget is not None and history + state > budget:
+        if fit == 'memmap':
+            storage = 'memmap'
+        else:
+            ntr = int((budget - state) // (history/ntr))
+            if ntr < 1:
+                raise ValueError("The state alone needs %d bytes, more than \
+the budget of %d bytes." % (state, budget))
+            history = footprint(network, ntr)[0]
+    stable_dt = min([ArteryNetwork.stable_dt(artery, cfl)
+                     for artery in network.arteries])
+    nt = int(round(network.tf / network.dt))
+    runtime = None
+    # an unstable run would stop within the calibration
+    if steps > 0 and network.dt <= stable_dt:
+        runtime = nt * step_time(network, q_in, min(steps, nt))
+    return {'arteries': len(network.arteries),
+            'cells': sum([artery.nx for artery in network.arteries]),
+            'dt': network.dt, 'stable_dt': stable_dt, 'steps': nt,
+            'ntr': ntr, 'storage': storage,
+            'memory': state + (history if storage == 'memory' else 0),
+            'disk': history if storage == 'memmap' else 0,
+            'runtime': runtime}
+            
+            
+def format_plan(p):
+    lines = ["arteries   %d" % (p['arteries']),
+             "cells      %d" % (p['cells']),
+             "dt         %.3e (stable %.3e)%s" % (p['dt'], p['stable_dt'],
+                    "  UNSTABLE" if p['dt'] > p['stable_dt'] else ""),
+             "steps      %d" % (p['steps']),
+             "ntr        %d" % (p['ntr']),
+             "storage    %s" % (p['storage']),
+             "memory     %.1f MB" % (p['memory']/2**20),
+             "disk       %.1f MB" % (p['disk']/2**20)]
+    if p['runtime'] is not None:
+        lines.append("runtime    %.1f s" % (p['runtime']))
+    return "\n".join(lines)
+    
+    
+def main(argv=None):
+    # usage: vampy-plan config [budget_MB] [decimate|memmap]
+    if argv is None:
+        argv = sys.argv[1:]
+    if len(argv) < 1:
+        sys.stderr.write("usage: vampy-plan config [budget_MB] \
+[decimate|memmap]\n")
+        return 1
+    budget = float(argv[1])*2**20 if len(argv) > 1 else None
+    fit = argv[2] if len(argv) > 2 else 'decimate'
+    sys.stdout.write(format_plan(plan(argv[0], budget, fit)) + "\n")
+    return 0
+    
+    
+if __name__ == '__main__':
+    sys.exit(main())
+    
\ No newline at end of file
@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import division
+
+import numpy as np
+
+
+class Probe(object):
+    """
+    Class recording area, flow and pressure at a fixed position in an artery
+    at every time step.
+    """
+    
+    
+    def __init__(self, artery, x, n=1024):
+        # linear interpolation weights of position x on the artery grid, n is
+        # the initial number of samples allocated
+        if x < 0 or x > artery.L:
+            raise ValueError("Probe position %e outside of artery %d of \
+length %e." % (x, artery.pos, artery.L))
+        self._artery = artery
+        self._x = x
+        self._j = min(int(x/artery.dx), artery.nx-2)
+        self._w = x/artery.dx - self._j
+        self._data = np.zeros((4, n))
+        self._n = 0
+        
+        
+    def record(self, t, U):
+        if self._n == self._data.shape[1]:
+            self._data = np.concatenate((self._data, np.zeros_like(self._data)),
+                                        axis=1)
+        j = self._j
+        w = np.array([1-self._w, self._w])
+        a = U[0,j:j+2]
+        a0 = self._artery.A0[j:j+2]
+        p = self._artery.f * (1 - np.sqrt(a0/a))
+        self._data[:,self._n] = [t, np.dot(w, a), np.dot(w, U[1,j:j+2]),
+                                 np.dot(w, p)]
+        self._n += 1
+        
+        
+    @property
+    def artery(self):
+        return self._artery
+        
+    @property
+    def x(self):
+        return self._x
+        
+    @property
+    def t(self):
+        return self._data[0,:self._n]
+        
+    @property
+    def a(self):
+        return self._data[1,:self._n]
+        
+    @property
+    def q(self):
+        return self._data[2,:self._n]
+        
+    @property
+    def p(self):
+        return self._data[3,:self._n]
@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import division
+
+import sys
+import time
+
+
+class Progress(object):
+    """
+    Class reporting progress, throughput and estimated time to completion of
+    a simulation.
+    """
+    
+    
+    def __init__(self, callback=None, interval=10.0):
+        # callback receives a dict with the progress information and is
+        # called at most every interval seconds of wall time
+        if callback is None:
+            callback = Progress.log
+        self._callback = callback
+        self._interval = interval
+        
+        
+    def start(self, network):
+        self._t0 = network.t
+        self._steps = 0
+        self._cells = sum([artery.nx * m for artery, m in
+                           zip(network.arteries, network.substeps())])
+        self._start = self._last = time.time()
+        
+        
+    def update(self, network):
+        self._steps += 1
+        now = time.time()
+        if now - self._last >= self._interval:
+            self._last = now
+            self._callback(self.info(network, now))
+            
+            
+    def finish(self, network):
+        self._callback(self.info(network, time.time()))
+        
+        
+    def info(self, network, now):
+        elapsed = now - self._start
+        fraction = min((network.t - self._t0) / (network.tf - self._t0), 1.0)
+        if elapsed > 0:
+            rate = self._steps * self._cells / elapsed
+        else:
+            rate = 0.0
+        if fraction > 0:
+            eta = elapsed * (1 - fraction) / fraction
+        else:
+            eta = float('inf')
+        # time history allocated so far, adaptive sampling grows it during
+        # the run and trims it at the end
+        memory = sum([artery.U.nbytes + artery.P.nbytes
+                      for artery in network.arteries])
+        return {'t': network.t, 'tf': network.tf, 'fraction': fraction,
+                'steps': self._steps, 'cell_updates_per_s': rate,
+                'memory': memory, 'elapsed': elapsed, 'eta': eta}
+        
+        
+    @staticmethod
+    def log(info, stream=sys.stderr):
+        stream.write("t = %e (%3.0f%%), %d steps, %.3e cell updates/s, "
+                     "%.1f MB, ETA %.0f s\n" % (info['t'],
+                     100*info['fraction'], info['steps'],
+                     info['cell_updates_per_s'], info['memory']/2**20,
+                     info['eta']))
+        
+        
+    @property
+    def interval(self):
+        return self._interval
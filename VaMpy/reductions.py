@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import division
+
+import numpy as np
+
+
+class Reductions(object):
+    """
+    Class accumulating running statistics of area, flow and pressure at every
+    grid point of an artery.
+    """
+    
+    
+    def __init__(self, nx, t0=0.0, T=0.0, harmonics=()):
+        # statistics are accumulated for t > t0, harmonics are the DFT bins
+        # with respect to period T
+        self._t0 = t0
+        self._T = T
+        self._harmonics = np.array(harmonics, dtype=int)
+        self._W = 0.0
+        self._mean = np.zeros((3, nx))
+        self._M2 = np.zeros((3, nx))
+        self._min = np.empty((3, nx))
+        self._min.fill(np.inf)
+        self._max = np.empty((3, nx))
+        self._max.fill(-np.inf)
+        self._dft = np.zeros((len(self._harmonics), 3, nx), dtype=complex)
+        
+        
+    def update(self, t, dt, a, q, p):
+        # time weighted update with the solution at the end of a time step
+        if t <= self.t0:
+            return
+        x = np.array([a, q, p])
+        self._W += dt
+        delta = x - self._mean
+        self._mean += dt/self._W * delta
+        self._M2 += dt * delta * (x - self._mean)
+        np.minimum(self._min, x, out=self._min)
+        np.maximum(self._max, x, out=self._max)
+        if len(self.harmonics) > 0:
+            w = np.exp(-2j*np.pi*self.harmonics*t/self.T) * dt
+            self._dft += w[:,None,None] * x
+            
+            
+    @property
+    def t0(self):
+        return self._t0
+        
+    @property
+    def T(self):
+        return self._T
+        
+    @property
+    def harmonics(self):
+        return self._harmonics
+        
+    @property
+    def mean(self):
+        return self._mean
+        
+    @property
+    def var(self):
+        return self._M2 / self._W
+        
+    @property
+    def min(self):
+        return self._min
+        
+    @property
+    def max(self):
+        return self._max
+        
+    @property
+    def pulse(self):
+        return self._max - self._min
+        
+    @property
+    def dft(self):
+        # complex Fourier coefficients of A, q and p for each harmonic
+        return self._dft / self._W
@@ -0,0 +1,144 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import division
+
+import multiprocessing
+import numpy as np
+
+from warm_start import get_state, set_state
+
+
+def sample(network, x):
+    """
+    Periodic quantities of a network at relative positions along every artery.
+    
+    :param network: ArteryNetwork with reductions over the last period.
+    :param x: Relative positions between 0 (inlet) and 1 (outlet).
+    :returns: Array of shape (arteries, harmonics + 1, 3, len(x)) holding the
+    mean and the amplitude of every harmonic of area, flow and pressure.
+    """
+    out = []
+    for artery in network.arteries:
+        r = artery.reductions
+        values = np.concatenate([r.mean[None], np.absolute(r.dft)])
+        xa = np.linspace(0.0, 1.0, artery.nx)
+        out.append([[np.interp(x, xa, v) for v in h] for h in values])
+    return np.array(out)
+    
+    
+def solve_level(args):
+    # runs one level of a refinement study, module level so that it can be
+    # sent to worker processes
+    factory, q_in, nx, dt, T, cycles, state, x, harmonics = args
+    network = factory(nx)
+    if state is not None:
+        set_state(network, state)
+    network.set_time(cycles*T, dt, T)
+    network.set_reductions(harmonics)
+    for t in network.run(q_in, history=False):
+        pass
+    return sample(network, x)
+    
+    
+class RefinementStudy(object):
+    """
+    Class running a network on a ladder of grids concurrently and estimating
+    the observed order of convergence.
+    """
+    
+    
+    def __init__(self, factory, q_in, T, nx=(21, 41, 81), dt=1e-3,
+                 transient=3, cycles=1, x=(0.0, 0.5, 1.0), harmonics=(1,)):
+        # factory(nx) returns a meshed network with initial conditions, dt is
+        # the time step on the coarsest grid and is refined with the grid
+        # spacing; factory and q_in need to be picklable to run in parallel
+        if len(nx) < 3:
+            raise ValueError("At least three levels are needed.")
+        r = [(nx[i+1]-1) / (nx[i]-1) for i in range(len(nx)-1)]
+        if max(r) - min(r) > 1e-12 or r[0] <= 1:
+            raise ValueError("Levels need a constant refinement ratio.")
+        self._factory = factory
+        self._q_in = q_in
+        self._T = T
+        self._nx = list(nx)
+        self._ratio = r[0]
+        self._dt = [dt / self._ratio**i for i in range(len(nx))]
+        self._transient = transient
+        self._cycles = cycles
+        self._x = np.array(x)
+        self._harmonics = tuple(harmonics)
+        self._quantities = None
+        
+        
+    def warm_state(self):
+        # periodic state on the coarsest grid after the transient
+        if self._transient == 0:
+            return None
+        network = self._factory(self._nx[0])
+        network.set_time(self._transient*self._T, self._dt[0], self._T)
+        for t in network.run(self._q_in, history=False):
+            pass
+        return get_state(network)
+        
+        
+    def run(self, processes=None):
+        # all levels start from the coarse periodic state, so they run
+        # concurrently and only need to settle the discretisation error
+        state = self.warm_state()
+        args = [(self._factory, self._q_in, nx, dt, self._T, self._cycles,
+                 state, self._x, self._harmonics)
+                for nx, dt in zip(self._nx, self._dt)]
+        if processes == 1:
+            self._quantities = map(solve_level, args)
+        else:
+            pool = multiprocessing.Pool(processes)
+            try:
+                self._quantities = pool.map(solve_level, args)
+            finally:
+                pool.close()
+                pool.join()
+        return self._quantities
+        
+        
+    @property
+    def quantities(self):
+        return self._quantities
+        
+    @property
+    def differences(self):
+        # largest change between successive levels
+        Q = self._quantities
+        return np.array([np.max(np.absolute(Q[i+1] - Q[i]))
+                         for i in range(len(Q)-1)])
+        
+    @property
+    def order(self):
+        # observed order of convergence from the three finest levels, None
+        # if either difference vanishes and the order is undefined
+        e = self.differences
+        if not (e[-2] > 0 and e[-1] > 0):
+            return None
+        return np.log(e[-2]/e[-1]) / np.log(self._ratio)
+        
+    @property
+    def extrapolated(self):
+        # Richardson extrapolation of the two finest levels, None unless the
+        # levels converge with a positive order
+        order = self.order
+        if order is None or not order > 0:
+            return None
+        Q = self._quantities
+        return Q[-1] + (Q[-1] - Q[-2]) / (self._ratio**order - 1)
+        
+    @property
+    def nx(self):
+        return self._nx
+        
+    @property
+    def dt(self):
+        return self._dt
+        
+    @property
+    def ratio(self):
+        return self._ratio
+        
\ No newline at end of file
@@ -0,0 +1,188 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import division
+
+import os
+import glob
+import hashlib
+import numpy as np
+
+import VaMpy
+import utils
+
+
+class ResultCache(object):
+    """
+    Class caching the results of whole runs on disk, keyed by a hash of all
+    inputs of the run, with least recently used eviction.
+    """
+    
+    
+    def __init__(self, cache_dir, max_size=2**30):
+        # max_size: maximum total size of the cache in bytes
+        if not os.path.exists(cache_dir):
+            os.makedirs(cache_dir)
+        self._cache_dir = cache_dir
+        self._max_size = max_size
+        
+        
+    @staticmethod
+    def update_hash(h, obj):
+        if isinstance(obj, dict):
+            for k in sorted(obj):
+                ResultCache.update_hash(h, k)
+                ResultCache.update_hash(h, obj[k])
+        elif isinstance(obj, (list, tuple)):
+            h.update(("%s%d" % (type(obj).__name__, len(obj))).encode())
+            for item in obj:
+                ResultCache.update_hash(h, item)
+        elif isinstance(obj, np.ndarray):
+            h.update(str(obj.shape).encode())
+            h.update(np.ascontiguousarray(obj, dtype=float).tobytes())
+        else:
+            h.update(repr(obj).encode())
+            
+            
+    @staticmethod
+    def source():
+        # hash of the source of the package, so that changes of the solver
+        # invalidate the cache even if the version number stays the same
+        h = hashlib.sha1()
+        for fname in sorted(glob.glob(os.path.join(os.path.dirname(
+                                      os.path.abspath(__file__)), "*.py"))):
+            h.update(os.path.basename(fname).encode())
+            with open(fname, 'rb') as f:
+                h.update(f.read())
+        return h.hexdigest()
+        
+        
+    @staticmethod
+    def key(*args, **kwargs):
+        """
+        Hashes the inputs of a run.
+        
+        Typically called with the dictionaries returned by utils.read_config,
+        the inlet waveform data and the mesh and time settings. The package
+        version and source are always part of the key.
+        
+        :returns: Hex digest identifying the run.
+        """
+        h = hashlib.sha1()
+        ResultCache.update_hash(h, VaMpy.__version__)
+        ResultCache.update_hash(h, ResultCache.source())
+        ResultCache.update_hash(h, list(args))
+        ResultCache.update_hash(h, kwargs)
+        return h.hexdigest()
+        
+        
+    @staticmethod
+    def network_key(network, q_in, p_out, T):
+        """
+        Hashes the inputs of a run of ArteryNetwork.solve.
+        
+        :param network: ArteryNetwork with mesh, initial conditions and time
+        settings.
+        :param q_in: Inlet flow, a function of time is identified by its
+        values at every half time step of the run.
+        :param p_out: Outlet pressure.
+        :param T: Period passed to ArteryNetwork.solve.
+        :returns: Hex digest identifying the run.
+        """
+        arteries = [[artery.R, artery.L, artery.f, artery.df, artery.rho,
+                     artery.nu, artery.Re, artery.delta, artery.k, artery.nx,
+                     artery.dx, artery.windkessel, artery.friction,
+                     artery.U0] for artery in network.arteries]
+        if callable(q_in):
+            n = int(np.ceil((network.tf - network.t)/network.dt))
+            t = network.t + network.dt/2 * np.arange(1, 2*n+1)
+            if network.T > 0:
+                t = [utils.periodic(ti, network.T) for ti in t]
+            q_in = np.array([q_in(ti) for ti in t])
+        boundaries = None
+        if network.boundaries is not None:
+            boundaries = [network.boundaries.outlet,
+                          network.boundaries.state()]
+        return ResultCache.key(arteries, q_in, p_out, T, a=network.a,
+                               b=network.b, depth=network.depth,
+                               tree_depth=network.tree_depth,
+                               windkessel=network.windkessel(network.rc,
+                                          network.qc, network.rho),
+                               t=network.t, dt=network.dt, tf=network.tf,
+                               T_network=network.T, tc=network.tc,
+                               ntr=network.ntr, lts=network.lts,
+                               scheme=network.scheme,
+                               sampling=network.sampling,
+                               boundaries=boundaries)
+        
+        
+    def fname(self, key):
+        return "%s/%s.npz" % (self._cache_dir, key)
+        
+        
+    def get(self, key):
+        # returns the cached results or None, a hit marks the entry as used
+        fname = self.fname(key)
+        if not os.path.exists(fname):
+            return None
+        os.utime(fname, None)
+        with np.load(fname) as data:
+            return dict((k, data[k]) for k in data.files)
+        
+        
+    def put(self, key, results):
+        np.savez(self.fname(key), **results)
+        self.evict()
+        
+        
+    def evict(self):
+        # remove least recently used entries until the cache fits max_size
+        entries = [(os.path.getmtime(f), os.path.getsize(f), f)
+                   for f in glob.glob("%s/*.npz" % (self._cache_dir))]
+        entries.sort()
+        size = sum([e[1] for e in entries])
+        while size > self.max_size and len(entries) > 0:
+            mtime, fsize, fname = entries.pop(0)
+            os.remove(fname)
+            size -= fsize
+            
+            
+    def solve(self, network, q_in, p_out, T, **kwargs):
+        # ArteryNetwork.solve that restores U, P and U0 of every artery, the
+        # output times and the final time from the cache on a hit, returns
+        # True on a hit
+        if network.params is not None or any([artery.reductions is not None
+                or len(artery.probes) > 0 for artery in network.arteries]):
+            # sensitivities, reductions and probes are not cached
+            network.solve(q_in, p_out, T, **kwargs)
+            return False
+        key = self.network_key(network, q_in, p_out, T)
+        results = self.get(key)
+        if results is not None:
+            for artery in network.arteries:
+                artery.U = results["U%d" % (artery.pos)]
+                artery.P = results["P%d" % (artery.pos)]
+                artery.U0 = results["U0%d" % (artery.pos)]
+            network.times = results["times"]
+            network.t = float(results["t"])
+            if network.boundaries is not None:
+                network.boundaries.load(results)
+            return True
+        network.solve(q_in, p_out, T, **kwargs)
+        results = {"times": network.times, "t": network.t}
+        for artery in network.arteries:
+            results["U%d" % (artery.pos)] = artery.U
+            results["P%d" % (artery.pos)] = artery.P
+            results["U0%d" % (artery.pos)] = artery.U0
+        if network.boundaries is not None:
+            results.update(network.boundaries.state())
+        self.put(key, results)
+        return False
+        
+        
+    @property
+    def cache_dir(self):
+        return self._cache_dir
+        
+    @property
+    def max_size(self):
+        return self._max_size
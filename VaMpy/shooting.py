@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import division
+
+import numpy as np
+from scipy.optimize import newton_krylov
+
+from warm_start import get_state
+from parareal import propagate
+
+
+class PeriodicShooting(object):
+    """
+    Class finding the periodic state of a network directly as the fixed point
+    of the map advancing the state by one period, using Newton-Krylov
+    iterations.
+    """
+    
+    
+    def __init__(self, factory, q_in, T, nx, dt, tol=1e-6, method='gmres'):
+        # factory(nx) returns a meshed network with initial conditions, T
+        # needs to be a multiple of dt
+        self._factory = factory
+        self._q_in = q_in
+        self._T = T
+        self._nx = nx
+        self._dt = dt
+        self._tol = tol
+        self._method = method
+        self._template = factory(nx)
+        self._evaluations = 0
+        
+        
+    def pack(self, state):
+        # stacked vector of the states of all arteries and the Windkessel
+        # pressures of characteristic boundaries
+        return np.concatenate([state["U%d" % (artery.pos)].ravel()
+                               for artery in self._template.arteries] +
+                              [state.get('Pc', np.zeros(0))])
+        
+        
+    def unpack(self, x):
+        state = get_state(self._template)
+        i = 0
+        for artery in self._template.arteries:
+            n = 2*artery.nx
+            state["U%d" % (artery.pos)] = x[i:i+n].reshape((2, artery.nx))
+            i += n
+        if 'Pc' in state:
+            state['Pc'] = x[i:]
+        return state
+        
+        
+    def period(self, x):
+        # state after one period starting from x
+        self._evaluations += 1
+        return self.pack(propagate((self._factory, self._q_in, self._nx,
+                                    self._dt, self._T, self.unpack(x))))
+        
+        
+    def residual(self, x):
+        return self.period(x) - x
+        
+        
+    def solve(self, state=None, maxiter=20):
+        # periodic state starting from state, defaults to the initial
+        # conditions of the network; raises scipy's NoConvergence if the
+        # residual does not drop below tol within maxiter Newton steps
+        if state is None:
+            state = get_state(self._template)
+        x = newton_krylov(self.residual, self.pack(state), f_tol=self._tol,
+                          method=self._method, maxiter=maxiter)
+        return self.unpack(x)
+        
+        
+    @property
+    def evaluations(self):
+        # number of periods integrated so far
+        return self._evaluations
+        
\ No newline at end of file
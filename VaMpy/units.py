@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import division
+
+import numpy as np
+
+
+# reference pressure added to physical pressures in mmHg
+P_REF = 85.0
+# dyn/cm^2 per mmHg
+MMHG = 1.01325e6/760
+
+
+def scale(quantity, units, rc, qc, rho):
+    """
+    Scale and offset converting nondimensional results to physical units.
+    
+    :param quantity: 'a' (area), 'q' (flow) or 'p' (pressure).
+    :param units: 'nondim', 'cgs' or 'SI', or 'mmHg' for pressure.
+    :param rc: Characteristic radius in cm.
+    :param qc: Characteristic flow in cm^3/s.
+    :param rho: Density in g/cm^3.
+    :returns: Tuple (scale, offset) such that physical = offset + scale*x.
+    """
+    if units == 'nondim':
+        return 1.0, 0.0
+    if quantity == 'a':
+        s = {'cgs': rc**2, 'SI': rc**2 * 1e-4}
+    elif quantity == 'q':
+        s = {'cgs': qc, 'SI': qc * 1e-6}
+    elif quantity == 'p':
+        p = rho*qc**2/rc**4
+        s = {'cgs': (p, P_REF*MMHG), 'SI': (0.1*p, 0.1*P_REF*MMHG),
+             'mmHg': (p/MMHG, P_REF)}
+    else:
+        raise ValueError("Unknown quantity %s." % (quantity))
+    if units not in s:
+        raise ValueError("Unknown units %s for %s." % (units, quantity))
+    return s[units] if quantity == 'p' else (s[units], 0.0)
+    
+    
+class ScaledView(object):
+    """
+    Class giving read-only access to an array in other units, the scaling is
+    applied to the requested part only.
+    """
+    
+    
+    def __init__(self, data, scale=1.0, offset=0.0):
+        self._data = data
+        self._scale = scale
+        self._offset = offset
+        
+        
+    def __getitem__(self, index):
+        return self._offset + self._scale * self._data[index]
+        
+        
+    def __array__(self, dtype=None):
+        out = self[...]
+        return out if dtype is None else out.astype(dtype)
+        
+        
+    def __len__(self):
+        return len(self._data)
+        
+        
+    def chunks(self, n=1024):
+        # blocks of at most n rows
+        for i in range(0, len(self), n):
+            yield self[i:i+n]
+            
+            
+    @property
+    def shape(self):
+        return self._data.shape
+        
+    @property
+    def ndim(self):
+        return self._data.ndim
+        
+    @property
+    def data(self):
+        return self._data
+        
+    @property
+    def scale(self):
+        return self._scale
+        
+    @property
+    def offset(self):
+        return self._offset
+        
\ No newline at end of file
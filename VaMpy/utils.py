@@ -1,4 +1,5 @@
 import ConfigParser
+import numpy as np
 import matplotlib.pylab as plt
 
 
@@ -63,4 +64,24 @@ def periodic(t, T):
     
     
 def extrapolate(x0, x, y):
-    return y[0] + (y[1]-y[0]) * (x0 - x[0])/(x[1] - x[0])
\ No newline at end of file
+    return y[0] + (y[1]-y[0]) * (x0 - x[0])/(x[1] - x[0])
+    
+    
+def resample(t, y, t_new):
+    """
+    Linear interpolation of results onto other output times.
+    
+    Maps adaptively sampled results onto a uniform grid, e.g.
+    resample(network.times, artery.P, np.linspace(t0, t1, n)).
+    
+    :param t: Increasing times of the results.
+    :param y: Results with time along the first axis, an array or a
+    ScaledView.
+    :param t_new: Output times, clipped to the range of t.
+    :returns: Array with len(t_new) rows.
+    """
+    t = np.asarray(t)
+    t_new = np.clip(np.asarray(t_new), t[0], t[-1])
+    i = np.clip(np.searchsorted(t, t_new, side='right') - 1, 0, len(t)-2)
+    w = ((t_new - t[i]) / (t[i+1] - t[i])).reshape((-1,) + (1,)*(y.ndim-1))
+    return (1-w) * y[i] + w * y[i+1]
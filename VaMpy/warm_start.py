@@ -0,0 +1,147 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import division
+
+import os
+import glob
+import hashlib
+import numpy as np
+
+
+def set_state(network, data):
+    """
+    Initialises the arteries of network from stored states, interpolating
+    onto the current grids.
+    
+    :param network: ArteryNetwork with initial conditions set
+    :param data: Mapping with the state U%d and reference area A0%d of every
+    artery and, for characteristic boundaries, the outlet state Pc and W0;
+    without it the boundaries are set up again from the new state
+    """
+    for artery in network.arteries:
+        # areas are interpolated relative to the reference area so that
+        # states of neighbouring geometries keep their distension
+        U = data["U%d" % (artery.pos)]
+        A0 = data["A0%d" % (artery.pos)]
+        x = np.linspace(0.0, 1.0, artery.nx)
+        xc = np.linspace(0.0, 1.0, U.shape[1])
+        artery.U0[0,:] = np.interp(x, xc, U[0]/A0) * artery.A0
+        artery.U0[1,:] = np.interp(x, xc, U[1])
+    if network.boundaries is not None:
+        if 'Pc' in data:
+            network.boundaries.load(data)
+        else:
+            network.set_boundaries(network.boundaries.outlet)
+            
+            
+def get_state(network):
+    """
+    Returns the current state of every artery in the format read by
+    set_state.
+    
+    :param network: ArteryNetwork
+    """
+    data = dict(("U%d" % (artery.pos), artery.U0.copy())
+                for artery in network.arteries)
+    data.update(("A0%d" % (artery.pos), artery.A0.copy())
+                for artery in network.arteries)
+    if network.boundaries is not None:
+        data.update(network.boundaries.state())
+    return data
+
+
+class StateCache(object):
+    """
+    Class storing the final state of every artery of a network on disk,
+    keyed by the geometry and material parameters of the network.
+    """
+    
+    
+    def __init__(self, cache_dir, max_distance=0.5):
+        # max_distance: largest relative difference in parameters of a
+        # cached state that is still used to initialise a network
+        if not os.path.exists(cache_dir):
+            os.makedirs(cache_dir)
+        self._cache_dir = cache_dir
+        self._max_distance = max_distance
+        
+        
+    @staticmethod
+    def parameters(network):
+        # geometry and material parameters and the outlet Windkessel of
+        # every artery, the mesh is not part of the key because states are
+        # interpolated onto the new grid
+        params = []
+        windkessel = network.windkessel(network.rc, network.qc, network.rho)
+        for artery in network.arteries:
+            p = [np.mean(artery.R), artery.R[0], artery.R[-1], artery.L,
+                 artery.f, artery.df, artery.Re, artery.delta]
+            if artery.windkessel is not None:
+                p.extend(artery.windkessel)
+            else:
+                p.extend(windkessel)
+            params.append(p)
+        return params
+        
+        
+    @staticmethod
+    def key(network):
+        h = hashlib.sha1()
+        for p in StateCache.parameters(network):
+            h.update(np.array(p, dtype=float).round(12).tobytes())
+        return h.hexdigest()
+        
+        
+    def fname(self, key):
+        return "%s/%s.npz" % (self._cache_dir, key)
+        
+        
+    def store(self, network):
+        # the state should be taken at the end of a whole number of periods
+        # so that it matches the phase of the inlet at t = 0
+        params = np.array(StateCache.parameters(network))
+        np.savez(self.fname(StateCache.key(network)), params=params,
+                 **get_state(network))
+        
+        
+    def nearest(self, network):
+        # exact match or the cached network with the same topology and the
+        # smallest relative difference in parameters, None if that exceeds
+        # max_distance
+        key = StateCache.key(network)
+        if os.path.exists(self.fname(key)):
+            return self.fname(key)
+        params = np.array(StateCache.parameters(network))
+        best = None
+        dist = self.max_distance
+        for fname in glob.glob("%s/*.npz" % (self._cache_dir)):
+            with np.load(fname) as f:
+                cached = f['params']
+            if cached.shape != params.shape:
+                continue
+            d = np.max(np.absolute(cached - params) /
+                       np.maximum(np.absolute(params), np.finfo(float).tiny))
+            if d <= dist:
+                best = fname
+                dist = d
+        return best
+        
+        
+    def load(self, network):
+        # initialise the arteries from the nearest cached state, returns
+        # False if there is none
+        fname = self.nearest(network)
+        if fname is None:
+            return False
+        with np.load(fname) as f:
+            set_state(network, f)
+        return True
+        
+        
+    @property
+    def cache_dir(self):
+        return self._cache_dir
+        
+    @property
+    def max_distance(self):
+        return self._max_distance
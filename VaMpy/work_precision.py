@@ -0,0 +1,320 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import division
+
+import os
+import sys
+import json
+import time
+import numpy as np
+
+from artery_network import ArteryNetwork
+from compare import compare_quantity
+from examples import example_network
+import utils
+
+
+# reference problems, depth of the network, period of the inlet flow and
+# number of periods, the last of which is compared after the start-up
+# transient has passed
+PROBLEMS = {'bifurcation': (2, 1.0, 3), 'tree': (3, 1.0, 3)}
+
+# solver configurations, keyword arguments of ArteryNetwork.set_time and the
+# outlet of ArteryNetwork.set_boundaries
+CONFIGS = {'lax_wendroff': {'scheme': 'lax_wendroff'},
+           'muscl_hancock': {'scheme': 'muscl_hancock'},
+           'lts': {'scheme': 'lax_wendroff', 'lts': True},
+           'characteristics': {'scheme': 'lax_wendroff',
+                               'outlet': 'windkessel'}}
+                               
+# default grid of the suite
+NX = (21, 41, 81, 161)
+DT = (4e-3, 2e-3, 1e-3, 5e-4)
+
+# relative positions of the probes along every artery
+X = (0.0, 0.5, 1.0)
+
+
+class Unstable(ValueError):
+    """
+    Raised by measure if a run becomes unstable, unlike configuration errors
+    this is an expected outcome of a point of the suite.
+    """
+    
+    
+def inlet_flow(t):
+    return 0.5 + 0.2*np.sin(2*np.pi*t)
+    
+    
+def problem_network(problem, nx):
+    """
+    Network of a reference problem.
+    
+    :param problem: Name of the problem in PROBLEMS.
+    :param nx: Number of grid points per artery.
+    :returns: Meshed ArteryNetwork with initial conditions and without time
+    history.
+    """
+    if problem not in PROBLEMS:
+        raise ValueError("Unknown problem %s." % (problem))
+    return example_network(PROBLEMS[problem][0], nx, history=False)
+    
+    
+def output_times(problem, n=100):
+    # n times over the last period of a problem
+    depth, T, cycles = PROBLEMS[problem]
+    return np.linspace((cycles-1)*T, cycles*T, n+1)[1:]
+    
+    
+def measure(problem, nx, dt, config='lax_wendroff', t=None):
+    """
+    Runs a reference problem and samples area, flow and pressure at the
+    probes.
+    
+    :param problem: Name of the problem in PROBLEMS.
+    :param nx: Number of grid points per artery.
+    :param dt: Time step.
+    :param config: Name of the solver configuration in CONFIGS.
+    :param t: Output times, defaults to output_times(problem).
+    :returns: Tuple of the wall time of the time loop in seconds and the
+    samples of shape (len(t), 3, arteries*len(X)), the quantities are area,
+    flow and pressure. Raises Unstable if the run becomes unstable and
+    ValueError for invalid configurations.
+    """
+    if config not in CONFIGS:
+        raise ValueError("Unknown configuration %s." % (config))
+    if t is None:
+        t = output_times(problem)
+    kwargs = dict(CONFIGS[config])
+    outlet = kwargs.pop('outlet', None)
+    network = problem_network(problem, nx)
+    T = PROBLEMS[problem][1]
+    # the last step ends at or after T
+    network.set_time(t[-1] + dt, dt, T, **kwargs)
+    # local time stepping runs the arteries with a fraction of dt
+    if any([dt/m > ArteryNetwork.stable_dt(artery, 1.0) for artery, m in
+            zip(network.arteries, network.substeps())]):
+        raise Unstable("Run of %s with nx=%d and dt=%e is unstable." % (
+                       problem, nx, dt))
+    probes = [network.add_probe(artery.pos, x*artery.L)
+              for artery in network.arteries for x in X]
+    if outlet is not None:
+        network.set_boundaries(outlet)
+    t0 = network.t
+    start = time.time()
+    try:
+        for tn in network.run(inlet_flow, history=False):
+            pass
+    except ValueError:
+        # the configuration is checked before the first step, later errors
+        # are violations of the CFL condition
+        if network.t == t0:
+            raise
+        raise Unstable("Run of %s with nx=%d and dt=%e is unstable." % (
+                       problem, nx, dt))
+    wall = time.time() - start
+    data = np.array([[utils.resample(probe.t, getattr(probe, name), t)
+                      for probe in probes] for name in ['a', 'q', 'p']])
+    # the CFL condition is only checked next to the inlet of every artery
+    if not np.all(np.isfinite(data)):
+        raise Unstable("Run of %s with nx=%d and dt=%e is unstable." % (
+                       problem, nx, dt))
+    return wall, data.transpose((2, 0, 1))
+    
+    
+def reference(problem, nx=641, dt=1e-4, config='lax_wendroff'):
+    """
+    High resolution reference solution of a problem.
+    
+    :param problem: Name of the problem in PROBLEMS.
+    :param nx: Number of grid points per artery.
+    :param dt: Time step.
+    :param config: Name of the solver configuration in CONFIGS.
+    :returns: Dictionary with the problem, the settings of the run, the
+    output times t, the probe positions x and the samples data.
+    """
+    t = output_times(problem)
+    data = measure(problem, nx, dt, config, t)[1]
+    return {'problem': problem, 'nx': nx, 'dt': dt, 'config': config,
+            't': t, 'x': np.array(X), 'data': data}
+            
+            
+def save_reference(fname, ref):
+    np.savez(fname, **ref)
+    
+    
+def load_reference(fname):
+    with np.load(fname) as f:
+        ref = dict((key, f[key]) for key in f.files)
+    for key in ['problem', 'config']:
+        ref[key] = ref[key].astype(str).item()
+    ref['nx'] = int(ref['nx'])
+    ref['dt'] = float(ref['dt'])
+    if not np.allclose(ref['x'], X):
+        raise ValueError("Reference %s was sampled at other probe \
+positions." % (fname))
+    return ref
+    
+    
+def errors(data, ref):
+    # relative L2 errors of area, flow and pressure over all probes and
+    # output times
+    return [compare_quantity(data[:,i], ref['data'][:,i])['rel_L2']
+            for i in range(3)]
+            
+            
+def suite(ref, nx=NX, dt=DT, configs=None, repeat=1):
+    """
+    Work-precision measurements against a reference solution.
+    
+    Every configuration runs on every combination of nx and dt, runs which
+    become unstable are recorded without wall time and error.
+    
+    :param ref: Reference solution as returned by reference.
+    :param nx: Numbers of grid points per artery.
+    :param dt: Time steps.
+    :param configs: Names of solver configurations, defaults to all of
+    CONFIGS.
+    :param repeat: Number of runs per point, the shortest wall time is kept.
+    :returns: List of records, dictionaries with the problem, config, nx,
+    dt, status ('ok' or 'unstable'), the number of grid points, wall time
+    in seconds, relative L2 errors of area, flow and pressure and error,
+    the largest of them.
+    """
+    if configs is None:
+        configs = sorted(CONFIGS)
+    for config in configs:
+        if config not in CONFIGS:
+            raise ValueError("Unknown configuration %s." % (config))
+    problem = ref['problem']
+    arteries = 2**PROBLEMS[problem][0] - 1
+    records = []
+    for config in configs:
+        for n in nx:
+            for h in dt:
+                record = {'problem': problem, 'config': config, 'nx': n,
+                          'dt': h, 'status': 'ok',
+                          'cells': n*arteries,
+                          'wall': None, 'error_a': None, 'error_q': None,
+                          'error_p': None, 'error': None}
+                try:
+                    walls = []
+                    for r in range(repeat):
+                        wall, data = measure(problem, n, h, config, ref['t'])
+                        walls.append(wall)
+                except Unstable:
+                    record['status'] = 'unstable'
+                    records.append(record)
+                    continue
+                e = errors(data, ref)
+                record.update({'wall': min(walls), 'error_a': e[0],
+                               'error_q': e[1], 'error_p': e[2],
+                               'error': max(e)})
+                records.append(record)
+    return records
+    
+    
+def pareto(records):
+    """
+    Work-precision front, the records no other record beats in both wall
+    time and error.
+    
+    :param records: Records as returned by suite.
+    :returns: Records of the front, sorted by wall time.
+    """
+    front = []
+    for record in sorted([r for r in records if r['status'] == 'ok'],
+                         key=lambda r: (r['wall'], r['error'])):
+        if len(front) == 0 or record['error'] < front[-1]['error']:
+            front.append(record)
+    return front
+    
+    
+def key(record):
+    return (record['problem'], record['config'], record['nx'], record['dt'])
+    
+    
+def regressions(records, baseline, rtol=0.05, atol=1e-8):
+    """
+    Points whose accuracy got worse than in a baseline.
+    
+    :param records: Records as returned by suite.
+    :param baseline: Earlier records, points missing in the baseline are
+    ignored.
+    :param rtol: Tolerated relative increase of the error.
+    :param atol: Tolerated absolute increase of the error.
+    :returns: List of tuples (record, baseline record) whose error grew by
+    more than the tolerances or which became unstable, followed by tuples
+    (None, baseline record) of the baseline points missing in records.
+    """
+    base = dict((key(r), r) for r in baseline)
+    out = []
+    for record in records:
+        b = base.get(key(record))
+        if b is None or b['status'] != 'ok':
+            continue
+        if record['status'] != 'ok' or\
+           record['error'] > b['error']*(1 + rtol) + atol:
+            out.append((record, b))
+    measured = set(key(r) for r in records)
+    out.extend((None, b) for b in baseline if key(b) not in measured)
+    return out
+    
+    
+def write_records(fname, records):
+    with open(fname, 'w') as f:
+        json.dump(records, f, indent=1, sort_keys=True)
+        
+        
+def read_records(fname):
+    with open(fname, 'r') as f:
+        return json.load(f)
+        
+        
+def format_records(records):
+    lines = ["%-16s %5s %10s %10s %12s %12s" % ('config', 'nx', 'dt',
+             'wall[s]', 'error', 'status')]
+    for r in records:
+        if r['status'] == 'ok':
+            lines.append("%-16s %5d %10.3e %10.3f %12.4e %12s" % (
+                         r['config'], r['nx'], r['dt'], r['wall'],
+                         r['error'], r['status']))
+        else:
+            lines.append("%-16s %5d %10.3e %10s %12s %12s" % (r['config'],
+                         r['nx'], r['dt'], '-', '-', r['status']))
+    return "\n".join(lines)
+    
+    
+def main(argv=None):
+    # usage: vampy-work-precision reference.npz [records.json] [baseline.json]
+    # the reference is computed for the bifurcation problem if it does not
+    # exist, the exit status is 2 if the errors regressed against baseline
+    if argv is None:
+        argv = sys.argv[1:]
+    if len(argv) < 1:
+        sys.stderr.write("usage: vampy-work-precision reference.npz \
+[records.json] [baseline.json]\n")
+        return 1
+    if not os.path.exists(argv[0]):
+        save_reference(argv[0], reference('bifurcation'))
+    records = suite(load_reference(argv[0]))
+    sys.stdout.write(format_records(records) + "\n")
+    if len(argv) > 1:
+        write_records(argv[1], records)
+    if len(argv) > 2:
+        worse = regressions(records, read_records(argv[2]))
+        for record, b in worse:
+            if record is None:
+                sys.stdout.write("missing: %s nx=%d dt=%.3e\n" % (
+                                 b['config'], b['nx'], b['dt']))
+                continue
+            sys.stdout.write("regression: %s nx=%d dt=%.3e error %s, was \
+%.4e\n" % (record['config'], record['nx'], record['dt'], record['error'],
+           b['error']))
+        if len(worse) > 0:
+            return 2
+    return 0
+    
+    
+if __name__ == '__main__':
+    sys.exit(main())
@@ -108,7 +108,10 @@ setup(
     # pip to create the appropriate form of executable for the target platform.
     entry_points={
         'console_scripts': [
-            'sample=sample:main',
+            'vampy-jobs=VaMpy.job_server:main',
+            'vampy-scaling=VaMpy.distributed:main',
+            'vampy-plan=VaMpy.planner:main',
+            'vampy-work-precision=VaMpy.work_precision:main',
         ],
     },
 )
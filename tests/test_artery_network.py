@@ -1,7 +1,9 @@
 # -*- coding: utf-8 -*-
 
-from pyFDM.artery_network import *
+from VaMpy.artery_network import *
 from scipy.interpolate import interp1d
+import tempfile
+import shutil
 
 
 def parameter():
@@ -97,4 +99,221 @@ def test_solve():
     for i in range(len(An)):    
         assert len(An[i]) == ntr
         assert len(Un[i]) == ntr
-    
\ No newline at end of file
+        
+    
+def network():
+    R = np.linspace(0.37, 0.37, 20)
+    k = (1.89e5, -22.53, 8160.0)
+    an = ArteryNetwork(R, 0.91, 0.7, 50, 1.06, 0.046, 0.1, 3, ntr=10,
+                       nondim=[1.0, 10.0, 217.4], k=k)
+    an.mesh(20)
+    an.initial_conditions(0.5, 10)
+    return an
+    
+    
+def test_substeps():
+    an = network()
+    an.set_time(1.0, 8e-3)
+    assert an.substeps() == [1] * len(an.arteries)
+    an.set_time(1.0, 8e-3, lts=True)
+    m = an.substeps()
+    assert max(m) > 1
+    for artery, n in zip(an.arteries, m):
+        assert an.dt/n <= an.stable_dt(artery)
+        assert n == 1 or an.dt/n*2 > an.stable_dt(artery)
+        
+        
+def test_bifurcation():
+    an = network()
+    p, d1, d2 = an.arteries[:3]
+    U_out, U_in1, U_in2 = an.bifurcation(p, d1, d2, 1e-3)
+    assert abs(U_out[1] - U_in1[1] - U_in2[1]) < 1e-8
+        
+        
+def test_mesh_dx():
+    an = network()
+    dx = 0.5
+    an.mesh(dx=dx)
+    for artery in an.arteries:
+        assert artery.dx <= dx
+        assert len(artery.A0) == artery.nx
+    summary = an.mesh_summary()
+    assert summary['cells'] == sum([artery.nx for artery in an.arteries])
+    assert summary['dt'] == min(summary['local_dt'])
+    an.mesh(ppw=20, T=9.17)
+    assert len(set([artery.nx for artery in an.arteries])) > 1
+        
+        
+def test_lumped_depth():
+    R = np.linspace(0.37, 0.37, 20)
+    k = (1.89e5, -22.53, 8160.0)
+    an = ArteryNetwork(R, 0.91, 0.7, 50, 1.06, 0.046, 0.1, 6, ntr=10,
+                       nondim=[1.0, 10.0, 217.4], k=k, lumped_depth=2)
+    assert an.depth == 2
+    assert an.tree_depth == 6
+    assert len(an.arteries) == 3
+    assert an.arteries[0].windkessel is None
+    for artery in an.arteries[1:]:
+        R1, R2, Ct = artery.windkessel
+        assert R1 > 0 and R2 >= 0 and Ct > 0
+    # identical subtrees are only evaluated once
+    assert len(an._impedance) < 2**5
+        
+        
+def sine_flow(t):
+    return 0.5 + 0.2*np.sin(t)
+    
+    
+def test_iter_solve():
+    an = network()
+    an.initial_conditions(0.5, 0)
+    for artery in an.arteries:
+        assert artery.U.size == 0
+    an.set_time(0.1, 1e-3)
+    snapshots = [(s.t, s.P[0].copy()) for s in an.iter_solve(sine_flow, 10)]
+    assert len(snapshots) == 9
+    assert abs(snapshots[0][0] - 0.01) < 1e-12
+    assert len(snapshots[0][1]) == an.arteries[0].nx
+    an = network()
+    an.set_time(0.1, 1e-3)
+    for s in an.iter_solve(sine_flow):
+        if s.t >= 0.05:
+            break
+    assert an.t < 0.0505
+    
+    
+def test_sensitivities():
+    def solve(h=0.0, params=None):
+        an = network()
+        an.set_time(0.05, 1e-3, 0.05)
+        R1, R2, Ct = an.windkessel(an.rc, an.qc, an.rho)
+        if params is None:
+            for artery in an.arteries[3:]:
+                artery.windkessel = (R1+h, R2, Ct)
+        else:
+            an.set_sensitivities(params)
+        an.solve(sine_flow, 0, 0.05)
+        return an
+    an = solve(params=['R1'])
+    h = 1e-2
+    P1, P2 = solve(h).arteries[3].P, solve(-h).arteries[3].P
+    dP = (P1[-2] - P2[-2]) / (2*h)
+    assert np.max(np.absolute(an.arteries[3].dP[-2,:,0] - dP)) <\
+            1e-4 * np.max(np.absolute(dP))
+    an = network()
+    try:
+        an.set_sensitivities(['nu'])
+        assert False
+    except ValueError:
+        pass
+        
+        
+def test_friction_split():
+    R = np.linspace(0.37, 0.37, 20)
+    k = (1.89e5, -22.53, 8160.0)
+    for friction in ['explicit', 'split']:
+        # at low Reynolds numbers the explicit friction limits the time step
+        an = ArteryNetwork(R, 0.91, 0.7, 50, 1.06, 0.046, 0.1, 2, ntr=10,
+                           nondim=[1.0, 10.0, 0.01], k=k, friction=friction)
+        an.mesh(20)
+        an.initial_conditions(0.5, 10)
+        an.set_time(0.1, 1e-3, 0.1)
+        if friction == 'explicit':
+            try:
+                an.solve(sine_flow, 0, 0.1)
+                assert False
+            except ValueError:
+                pass
+        else:
+            an.solve(sine_flow, 0, 0.1)
+            for artery in an.arteries:
+                assert np.isfinite(artery.U0).all()
+            assert np.absolute(an.arteries[0].U0[1,1:-1]).max() < 0.5
+            # the boundary conditions see the friction at the rate of its
+            # exact decay, the scheme leaves it to friction_step
+            artery = an.arteries[1]
+            U = artery.U0.copy()
+            artery.friction_step(U, 1e-3)
+            dS = artery.S(artery.U0, 1e-3)[1] - artery.S(artery.U0)[1]
+            assert np.allclose(dS[1:-1], (U[1] - artery.U0[1])[1:-1]/1e-3)
+    try:
+        ArteryNetwork(R, 0.91, 0.7, 50, 1.06, 0.046, 0.1, 2, ntr=10,
+                      nondim=[1.0, 10.0, 0.01], k=k, friction='implicit')
+        assert False
+    except ValueError:
+        pass
+        
+        
+def test_sampling():
+    an = network()
+    an.set_time(0.2, 1e-3, 0.1)
+    an.set_sampling(dp=5.0, max_dt=0.02)
+    an.solve(sine_flow, 0, 0.1)
+    t = an.times
+    # first and last step of the period, at most max_dt apart
+    assert abs(t[0] - 0.1) < 1e-9 and abs(t[-1] - 0.199) < 1e-9
+    assert np.diff(t).max() < 0.02 + 1e-9
+    assert 5 < len(t) < 100
+    for artery in an.arteries:
+        assert artery.P.shape == (len(t), artery.nx)
+        assert artery.U.shape == (2, len(t), artery.nx)
+        # the trimmed history does not keep the grown buffer alive
+        assert artery.P.base is None and artery.U.base is None
+    # the stored snapshots are exact states of the uniform run
+    ref = network()
+    ref.set_time(0.2, 1e-3, 0.1)
+    for s in ref.iter_solve(sine_flow):
+        if np.absolute(t - s.t).min() < 1e-9:
+            i = np.absolute(t - s.t).argmin()
+            assert np.allclose(s.P[0], an.arteries[0].P[i])
+    an = network()
+    an.set_sampling(dp=5.0)
+    an.set_sampling()
+    an.set_time(0.2, 1e-3, 0.1)
+    an.solve(sine_flow, 0, 0.1)
+    assert len(an.times) == 10
+    # memory-mapped histories grow and shrink on disk
+    storage = tempfile.mkdtemp()
+    try:
+        an = network()
+        an.initial_conditions(0.5, 2, storage=storage)
+        an.set_time(0.2, 1e-3, 0.1)
+        an.set_sampling(dp=5.0, max_dt=0.02)
+        an.solve(sine_flow, 0, 0.1)
+        for artery in an.arteries:
+            assert isinstance(artery.P, np.memmap)
+            P = np.load(os.path.join(storage, "P%d.npy" % (artery.pos)))
+            assert P.shape == (len(an.times), artery.nx)
+            assert np.allclose(P, artery.P)
+        assert len(os.listdir(storage)) == 2*len(an.arteries)
+    finally:
+        shutil.rmtree(storage)
+    
+    
+def test_symmetry():
+    # geometry is shared by the a*b and b*a vessels, but their parents
+    # differ, so every artery is solved
+    an = network()
+    assert an.arteries[4].A0 is an.arteries[5].A0
+    assert an.arteries[3].A0 is not an.arteries[4].A0
+    assert an.representatives() == list(range(7))
+    R = np.linspace(0.37, 0.37, 20)
+    k = (1.89e5, -22.53, 8160.0)
+    results = []
+    for symmetry in [False, True]:
+        an = ArteryNetwork(R, 0.8, 0.8, 50, 1.06, 0.046, 0.1, 3, ntr=10,
+                           nondim=[1.0, 10.0, 217.4], k=k)
+        an.mesh(20)
+        an.initial_conditions(0.5, 10)
+        assert an.representatives() == [0, 1, 1, 3, 3, 3, 3]
+        probe = an.add_probe(6, 1.0)
+        an.set_symmetry(symmetry)
+        an.set_time(0.1, 1e-3, 0.1)
+        an.solve(sine_flow, 0, 0.1)
+        results.append((np.array([artery.P for artery in an.arteries]),
+                        probe.p))
+    assert np.allclose(results[0][0], results[1][0], rtol=1e-10)
+    assert np.allclose(results[0][1], results[1][1], rtol=1e-10)
+    # a changed state breaks the symmetry
+    an.arteries[2].U0[1,:] += 0.1
+    assert an.representatives() == [0, 1, 2, 3, 3, 5, 5]
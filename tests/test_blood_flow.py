@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+
+from VaMpy.blood_flow import *
+from VaMpy.artery_network import *
+from VaMpy.warm_start import get_state, set_state
+from VaMpy.examples import *
+import numpy as np
+
+
+def network(depth=2, u0=0.5, nx=21):
+    return example_network(depth, nx, u0, ntr=20)
+    
+    
+def sine_flow(t):
+    return 0.5 + 0.2*np.sin(2*np.pi*t/0.1)
+    
+    
+def test_wave_speed():
+    a0, f = 0.43, 1.9e5
+    a = np.array([0.4, 0.43, 0.5])
+    assert np.allclose(area(wave_speed(a, a0, f), a0, f), a)
+    
+    
+def test_junctions():
+    an = network(3)
+    an.set_time(0.05, 1e-4, 0.1)
+    for t in an.run(sine_flow):
+        pass
+    bc_in, bc_out = Characteristics(an).solve(sine_flow(0.05), 1e-4)
+    for p in range(3):
+        U = an.bifurcation(an.arteries[p], an.arteries[2*p+1],
+                           an.arteries[2*p+2], 1e-4)
+        assert np.allclose(U[0], bc_out[:,p], rtol=1e-10)
+        assert np.allclose(U[1], bc_in[:,2*p+1], rtol=1e-10)
+        assert np.allclose(U[2], bc_in[:,2*p+2], rtol=1e-10)
+        
+        
+def test_run():
+    # both boundary discretisations converge to the same solution, which
+    # needs about 80 grid points to be resolved
+    an = network(nx=81)
+    an.set_time(0.4, 1e-4, 0.1)
+    for t in an.run(sine_flow):
+        pass
+    ch = network(nx=81)
+    ch.set_time(0.4, 1e-4, 0.1)
+    ch.set_boundaries()
+    for t in ch.run(sine_flow):
+        pass
+    # same inlet flow, differences from the boundary discretisations
+    assert np.allclose(an.arteries[0].U[1,:,0], ch.arteries[0].U[1,:,0])
+    for a, b in zip(an.arteries, ch.arteries):
+        assert np.absolute(a.P - b.P).max() < 0.03*np.ptp(a.P)
+        
+        
+def test_non_reflecting():
+    # a pulse leaves the artery through a non-reflecting outlet
+    pulse = lambda t: 0.2*np.sin(np.pi*t/0.15)**2 if t < 0.15 else 0.0
+    res = {}
+    for outlet in ['windkessel', 'non_reflecting']:
+        an = network(1, 0.0)
+        an.set_time(0.55, 1e-3)
+        an.set_boundaries(outlet)
+        for t in an.run(pulse):
+            pass
+        res[outlet] = np.absolute(an.arteries[0].U0[1,:11]).max()
+    assert res['non_reflecting'] < 0.1*res['windkessel']
+    
+    
+def test_errors():
+    an = network()
+    try:
+        an.set_boundaries('open')
+        assert False
+    except ValueError:
+        pass
+    an.set_time(0.01, 1e-4, 0.1, lts=True)
+    an.set_boundaries()
+    try:
+        for t in an.run(sine_flow):
+            pass
+        assert False
+    except ValueError:
+        pass
+        
+        
+def test_state():
+    an = network()
+    an.set_time(0.05, 1e-4, 0.1)
+    an.set_boundaries()
+    for t in an.run(sine_flow):
+        pass
+    state = get_state(an)
+    assert np.allclose(state['Pc'], an.boundaries.Pc)
+    # the Windkessel pressures are restored with the arteries, warm starts
+    # at t = 0 with the inlet shifted to the phase of an
+    warm = network()
+    warm.set_boundaries()
+    set_state(warm, state)
+    assert np.allclose(warm.boundaries.Pc, an.boundaries.Pc)
+    t0 = an.t
+    an.set_time(t0 + 0.01 + 5e-5, 1e-4, 0.1)
+    warm.set_time(0.01 + 5e-5, 1e-4, 0.1)
+    for t in an.run(sine_flow):
+        pass
+    for t in warm.run(lambda t: sine_flow(t + t0)):
+        pass
+    assert np.allclose(warm.arteries[1].U0, an.arteries[1].U0, rtol=1e-10)
+    # without them the boundaries start from the new state
+    del state['Pc']
+    set_state(warm, state)
+    o = warm.arteries[-1]
+    R1 = warm.windkessel(warm.rc, warm.qc, warm.rho)[0]
+    assert np.allclose(warm.boundaries.Pc[-1],
+                       o.p(o.U0[0,-1:])[0] - R1*o.U0[1,-1])
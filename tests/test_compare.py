@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+
+from VaMpy.compare import *
+import numpy as np
+import tempfile
+import shutil
+
+
+eps = 1e-10
+
+
+def write_results(data_dir, suffix, shift, fmt):
+    t = np.linspace(0, 1, 50)
+    x = np.linspace(0, 1, 8)
+    for pos in range(3):
+        p = np.sin(2*np.pi*(t[:,None] - shift - x[None,:]/4)) + pos
+        for name, data in [('a', 2*p), ('u', 3*p), ('p', p)]:
+            fname = "%s/%s%d_%s.%s" % (data_dir, name, pos, suffix, fmt)
+            if fmt == 'npy':
+                np.save(fname, data)
+            else:
+                np.savetxt(fname, data, delimiter=',')
+                
+                
+def test_compare():
+    data_dir = tempfile.mkdtemp()
+    try:
+        write_results(data_dir, 'ref', 0.0, 'npy')
+        write_results(data_dir, 'same', 0.0, 'csv')
+        write_results(data_dir, 'shift', 2.0/49, 'npy')
+        assert positions(data_dir, 'ref') == [0, 1, 2]
+        assert isinstance(open_results(data_dir, 'p', 0, 'ref'), np.ndarray)
+        report = compare(data_dir, 'same', data_dir, 'ref', n=7)
+        assert len(report) == 9
+        for r in report.values():
+            assert r['Linf'] < eps
+            assert r['peak_shift_samples'] == 0
+        report = compare(data_dir, 'shift', data_dir, 'ref', n=7)
+        assert report[(0, 'p')]['rel_L2'] > 0
+        assert report[(1, 'p')]['max_peak_shift_samples'] >= 2
+        assert len(format_report(report).split("\n")) == 10
+    finally:
+        shutil.rmtree(data_dir)
+        
+        
+def test_steps():
+    # blocks of equal shape must not hide missing time steps
+    try:
+        compare_quantity(np.zeros((5, 3)), np.zeros((4, 3)), n=2)
+        assert False
+    except ValueError:
+        pass
+    data_dir = tempfile.mkdtemp()
+    try:
+        fname = "%s/p0_short.csv" % (data_dir)
+        np.savetxt(fname, np.zeros((4, 3)), delimiter=',')
+        assert steps(fname) == 4
+        try:
+            compare_quantity(np.zeros((5, 3)), fname, n=2)
+            assert False
+        except ValueError:
+            pass
+    finally:
+        shutil.rmtree(data_dir)
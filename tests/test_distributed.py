@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+
+from VaMpy.distributed import *
+from VaMpy.artery_network import *
+import functools
+import numpy as np
+
+
+def network(depth=3):
+    return benchmark_network(depth, 21, steps=200)
+    
+    
+def test_partition():
+    an = network(4)
+    owner = partition(an, 4)
+    assert owner == [0, 0, 2, 0, 1, 2, 3, 0, 1, 1, 2, 2, 3, 3, 3]
+    send, recv = halo(an, owner, 1)
+    assert sorted(send) == sorted(recv) == [0, 2]
+    # junctions at the outlets of arteries 1, 3 and 4
+    assert send[0] == [(4, 0), (8, 0)]
+    assert recv[0] == [(1, -1), (3, 0), (3, -1), (7, 0)]
+    assert send[2] == [(4, -1), (9, 0)]
+    assert recv[2] == [(10, 0)]
+    assert halo(an, owner, 0)[0][1] == recv[0]
+    
+    
+def test_solve():
+    an = network()
+    for t in an.run(benchmark_flow):
+        pass
+    for size in [2, 3]:
+        dn, wall = solve(network, benchmark_flow, size)
+        for a, b in zip(an.arteries, dn.arteries):
+            assert np.allclose(a.U0, b.U0, rtol=1e-12, atol=0)
+            assert np.allclose(a.P, b.P, rtol=1e-12, atol=0)
+            
+            
+def test_scaling():
+    results = scaling((1, 2), depth=2, nx=11, steps=20, weak=True)
+    assert [r[:3] for r in results] == [(1, 2, 33), (2, 3, 77)]
+    
+    
+def test_failure():
+    def factory():
+        an = network()
+        an.set_time(an.tf, 100*an.dt, 1.0)
+        return an
+    try:
+        solve(factory, benchmark_flow, 3)
+        assert False
+    except (ValueError, EOFError):
+        pass
+        
+        
+def test_history():
+    an = network()
+    dn = DistributedNetwork(an, PipeComm(0, 2, {}))
+    for artery in an.arteries:
+        if artery in dn.arteries:
+            assert artery.U.shape == (2, 10, 21)
+        else:
+            assert artery.U.shape == (2, 0, 21)
+            assert artery.P.shape == (0, 21)
+            
+            
+def test_lts():
+    an = network()
+    an.set_time(an.tf, an.dt, 1.0, lts=True)
+    try:
+        DistributedNetwork(an, PipeComm(0, 1, {}))
+        assert False
+    except ValueError:
+        pass
+        
+        
+def test_boundaries():
+    an = network()
+    an.set_boundaries()
+    try:
+        DistributedNetwork(an, PipeComm(0, 1, {}))
+        assert False
+    except ValueError:
+        pass
@@ -0,0 +1,38 @@
+# -*- coding: utf-8 -*-
+
+from VaMpy.frequency_domain import *
+from VaMpy.artery_network import *
+from VaMpy.examples import *
+import numpy as np
+
+
+def network():
+    return example_network(3, 20)
+    
+    
+def sine_flow(t):
+    return 0.5 + 0.2*np.sin(2*np.pi*t/9.17)
+    
+    
+def test_impedance():
+    an = network()
+    fd = FrequencyDomain(an, 9.17, 5)
+    # the zero frequency impedance is the total resistance of the tree
+    R1, R2, Ct = an.windkessel(an.rc, an.qc, an.rho)
+    assert abs(fd.input_impedance[0].imag) < 1e-12
+    assert fd.input_impedance[0].real > (R1 + R2)/4
+    assert len(fd.input_impedance) == 6
+    
+    
+def test_solve():
+    an = network()
+    fd = FrequencyDomain(an, 9.17, 5)
+    P, Q = fd.solve(sine_flow, 50)
+    assert P[0].shape == (50, an.arteries[0].nx)
+    assert abs(Q[0][:,0].mean() - 0.5) < 1e-10
+    assert np.allclose(Q[0][:,0], sine_flow(np.arange(50)*9.17/50))
+    # mass conservation and pressure continuity at the junctions
+    assert np.allclose(Q[0][:,-1], Q[1][:,0] + Q[2][:,0])
+    assert np.allclose(P[0][:,-1], P[2][:,0])
+    fd.initial_conditions()
+    assert np.allclose(an.arteries[3].U0[1], Q[3][0])
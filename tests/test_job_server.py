@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+
+from VaMpy.job_server import *
+from VaMpy import job_server
+import os
+import threading
+import tempfile
+import shutil
+
+
+def setup_config(data_dir):
+    cfg = """[Files]
+inlet = inlet.csv
+
+[Arteries]
+R = 0.37
+a = 0.91
+b = 0.7
+depth = 2
+
+[Simulation]
+nx = 20
+T = 0.1
+dt = 0.0005
+ntr = 10
+"""
+    fname = os.path.join(data_dir, 'config.cfg')
+    with open(fname, 'w') as f:
+        f.write(cfg)
+    with open(os.path.join(data_dir, 'inlet.csv'), 'w') as f:
+        f.write("0,5.0\n1,9.0\n2,5.0\n3,5.0\n")
+    return fname
+    
+    
+def test_run_job():
+    # inputs cached by other tests
+    job_server._inputs.clear()
+    data_dir = tempfile.mkdtemp()
+    try:
+        fname = setup_config(data_dir)
+        paths = run_job({'config': fname, 'suffix': 'a'})
+        assert len(paths) == 9
+        for path in paths:
+            assert os.path.exists(path)
+        key = list(job_server._inputs)[0]
+        assert key[0] == os.path.abspath(fname)
+        paths = run_job({'config': fname, 'suffix': 'b', 'fmt': 'npy',
+                         'overrides': {'Arteries': {'depth': 1}}})
+        assert len(paths) == 3
+        assert len(job_server._inputs) == 1
+    finally:
+        shutil.rmtree(data_dir)
+        
+        
+def test_server():
+    data_dir = tempfile.mkdtemp()
+    address = os.path.join(data_dir, 'jobs.sock')
+    try:
+        fname = setup_config(data_dir)
+        server = JobServer(address, 2)
+        thread = threading.Thread(target=server.serve)
+        thread.start()
+        ids = [submit({'config': fname, 'suffix': s}, address)
+               for s in ['a', 'b']]
+        reply = wait(ids[1], address)
+        assert reply['state'] == 'done'
+        assert os.path.exists(reply['result'][0])
+        # fetched results are dropped
+        assert request({'cmd': 'status', 'id': ids[1]}, address)['state'] ==\
+                'unknown'
+        assert len(server.jobs) == 1
+        assert os.stat(key_file(address)).st_mode & 0o777 == 0o600
+        reply = wait(submit({'config': 'missing.cfg'}, address), address)
+        assert reply['state'] == 'failed'
+        assert request({'cmd': 'status', 'id': 10}, address)['state'] ==\
+                'unknown'
+        # bad requests are answered and do not stop the server
+        reply = request({'cmd': 'status'}, address)
+        assert reply['state'] == 'error'
+        assert request('status', address)['state'] == 'error'
+        assert request({'cmd': 'submit'}, address)['state'] == 'error'
+        conn = Client(address, authkey=read_key(address))
+        conn.close()
+        assert request({'cmd': 'status', 'id': 10}, address)['state'] ==\
+                'unknown'
+        try:
+            request({'cmd': 'status', 'id': 0}, address, b'guess')
+            assert False
+        except multiprocessing.AuthenticationError:
+            pass
+        request({'cmd': 'shutdown'}, address)
+        thread.join()
+    finally:
+        shutil.rmtree(data_dir)
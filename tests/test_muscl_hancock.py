@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+
+from VaMpy.muscl_hancock import *
+from VaMpy.artery_network import *
+from VaMpy.examples import *
+import numpy as np
+
+
+def test_limiter():
+    dl = np.array([1.0, 1.0, -1.0, 0.0])
+    dr = np.array([3.0, -1.0, -0.5, 2.0])
+    assert np.allclose(MusclHancock.limiter(dl, dr), [2.0, 0.0, -0.75, 0.0])
+    
+    
+def F(U, **kwargs):
+    # tube law with f = 8 and a0 = 1, the wave speed at rest is 2
+    a, q = U
+    return np.array([q, q*q/a + 8*np.sqrt(a)])
+    
+    
+def S(U, **kwargs):
+    return np.zeros(U.shape)
+    
+    
+def test_speed():
+    U = np.array([[1.0, 0.5], [0.5, 0.0]])
+    c = np.sqrt(4/np.sqrt(U[0]))
+    assert np.allclose(MusclHancock.speed(U, F(U)), U[1]/U[0] + c)
+    
+    
+def test_waves():
+    # a small pulse at rest splits into two halves travelling at c = 2
+    nx = 101
+    x = np.linspace(0, 1, nx)
+    mh = MusclHancock(nx, x[1])
+    eps = 1e-3
+    U = np.array([1 + eps*np.exp(-200*(x-0.5)**2), np.zeros(nx)])
+    U0 = U.copy()
+    dt = 0.4*x[1]/2
+    for n in range(int(round(0.1/dt))):
+        U = mh.solve(U, U0[:,0], U0[:,-1], 0, F, S, dt)
+    exact = 1 + eps/2*(np.exp(-200*(x-0.3)**2) + np.exp(-200*(x-0.7)**2))
+    assert np.max(np.absolute(U[0] - exact)) < 0.05*eps
+    assert U[0].max() <= U0[0].max() + 1e-12
+    
+    
+def sine_flow(t):
+    return 0.5 + 0.2*np.sin(t)
+    
+    
+def test_network():
+    an = example_network(2, 20)
+    an.set_time(0.1, 1e-3, scheme='muscl_hancock')
+    an.solve(sine_flow, 0, 0.1)
+    assert np.isfinite(an.arteries[0].P).all()
+    try:
+        an.set_time(0.1, 1e-3, scheme='upwind')
+        assert False
+    except ValueError:
+        pass
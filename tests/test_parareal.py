@@ -0,0 +1,38 @@
+# -*- coding: utf-8 -*-
+
+from VaMpy.parareal import *
+from VaMpy.artery_network import *
+from VaMpy.examples import *
+import numpy as np
+
+
+def network(nx):
+    return example_network(2, nx)
+    
+    
+def sine_flow(t):
+    return 0.5 + 0.2*np.sin(2*np.pi*t/0.1)
+    
+    
+def test_parareal():
+    T, cycles = 0.1, 4
+    pr = Parareal(network, sine_flow, T, cycles, 21, 1e-3, 11, 2e-3,
+                  tol=1e-8)
+    U = pr.run(2)
+    assert len(U) == cycles + 1
+    assert pr.iterations <= cycles
+    # serial fine reference
+    an = network(21)
+    an.set_time(cycles*T + 5e-4, 1e-3, T)
+    for t in an.run(sine_flow, history=False):
+        pass
+    for artery in an.arteries:
+        assert np.allclose(U[-1]["U%d" % (artery.pos)], artery.U0,
+                           rtol=1e-6)
+        
+        
+def test_convergence():
+    pr = Parareal(network, sine_flow, 0.1, 8, 21, 5e-4, 21, 1e-3, tol=1e-3)
+    pr.run(1)
+    assert pr.iterations < 8
+    assert pr.residuals[-1] < 1e-3
@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+
+from VaMpy.planner import *
+from VaMpy.job_server import read_inputs, build
+import os
+import tempfile
+import shutil
+import numpy as np
+
+
+def setup_config(data_dir):
+    cfg = """[Files]
+inlet = inlet.csv
+
+[Arteries]
+R = 0.37
+a = 0.91
+b = 0.7
+depth = 2
+
+[Simulation]
+nx = 20
+T = 0.1
+dt = 0.0005
+ntr = 50
+"""
+    fname = os.path.join(data_dir, 'config.cfg')
+    with open(fname, 'w') as f:
+        f.write(cfg)
+    with open(os.path.join(data_dir, 'inlet.csv'), 'w') as f:
+        f.write("0,5.0\n1,9.0\n2,5.0\n3,5.0\n")
+    return fname
+    
+    
+def test_plan():
+    data_dir = tempfile.mkdtemp()
+    try:
+        fname = setup_config(data_dir)
+        p = plan(fname)
+        assert p['arteries'] == 3
+        assert p['cells'] == 60
+        assert p['steps'] == 200
+        assert p['ntr'] == 50 and p['storage'] == 'memory'
+        assert p['memory'] == (3*50 + STATE_ARRAYS) * 60 * 8
+        assert p['dt'] < p['stable_dt']
+        assert p['runtime'] > 0
+        # the planned history matches the allocation of the run
+        files, arteries, sim, inlet = read_inputs(fname)
+        network = build(arteries, sim, inlet)[0]
+        assert footprint(network, 50)[0] == sum([a.U.nbytes + a.P.nbytes
+                                              for a in network.arteries])
+    finally:
+        shutil.rmtree(data_dir)
+        
+        
+def test_budget():
+    data_dir = tempfile.mkdtemp()
+    try:
+        fname = setup_config(data_dir)
+        budget = (3*10 + STATE_ARRAYS) * 60 * 8
+        p = plan(fname, budget, steps=0)
+        assert p['ntr'] == 10 and p['memory'] <= budget
+        assert p['runtime'] is None
+        p = plan(fname, budget, 'memmap', steps=0)
+        assert p['ntr'] == 50 and p['storage'] == 'memmap'
+        assert p['disk'] == 3*50*60*8
+        try:
+            plan(fname, 100, steps=0)
+            assert False
+        except ValueError:
+            pass
+    finally:
+        shutil.rmtree(data_dir)
+        
+        
+def test_storage():
+    data_dir = tempfile.mkdtemp()
+    try:
+        fname = setup_config(data_dir)
+        files, arteries, sim, inlet = read_inputs(fname)
+        storage = os.path.join(data_dir, 'storage')
+        network, q_in, T = build(arteries, sim, inlet, storage=storage)
+        network.solve(q_in, 0, T)
+        P = np.load(os.path.join(storage, 'P1.npy'))
+        assert np.allclose(P, network.arteries[1].P)
+        assert np.absolute(P).max() > 0
+    finally:
+        shutil.rmtree(data_dir)
+        
\ No newline at end of file
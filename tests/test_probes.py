@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+
+from VaMpy.probes import *
+from VaMpy.artery_network import *
+from VaMpy.examples import *
+import numpy as np
+
+
+eps = 1e-10
+
+
+def network():
+    an = example_network(2, 20, history=False)
+    an.set_time(0.1, 1e-3)
+    return an
+    
+    
+def test_init():
+    an = network()
+    artery = an.arteries[0]
+    probe = Probe(artery, 3.0)
+    assert probe.x == 3.0
+    assert len(probe.t) == 0
+    try:
+        Probe(artery, 2*artery.L)
+        assert False
+    except ValueError:
+        pass
+    
+    
+def test_record():
+    an = network()
+    artery = an.arteries[0]
+    probe = Probe(artery, artery.dx * 2.5, n=2)
+    U = np.array([artery.A0, np.arange(artery.nx)])
+    for i in range(5):
+        probe.record(i, U)
+    assert len(probe.t) == 5
+    assert abs(probe.q - 2.5).max() < eps
+    assert abs(probe.p).max() < eps
+    
+    
+def test_network_probes():
+    an = network()
+    probes = [an.add_probe(0, 0.0), an.add_probe(1, an.arteries[1].L)]
+    for s in an.iter_solve(lambda t: 0.5 + 0.1*np.sin(20*np.pi*t)):
+        pass
+    for probe in probes:
+        assert len(probe.t) == len(probe.p)
+        assert len(probe.t) > 90
+    assert abs(probes[1].q[-1] - an.arteries[1].U0[1,-1]) < eps
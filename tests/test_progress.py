@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+
+from VaMpy.progress import *
+from VaMpy.artery_network import *
+from VaMpy.examples import *
+import numpy as np
+
+
+def network():
+    an = example_network(2, 20)
+    an.set_time(0.1, 1e-3)
+    return an
+    
+    
+def inlet(t):
+    return 0.5 + 0.2*np.sin(t)
+    
+    
+def test_init():
+    progress = Progress(interval=5.0)
+    assert progress.interval == 5.0
+    
+    
+def test_report():
+    an = network()
+    reports = []
+    progress = Progress(reports.append, interval=0.0)
+    an.solve(inlet, 0.0, 0.0, progress=progress)
+    assert len(reports) == reports[-2]['steps'] + 1
+    info = reports[-1]
+    assert info['fraction'] == 1.0
+    assert info['memory'] == sum([a.U.nbytes + a.P.nbytes
+                                  for a in an.arteries])
+    assert info['cell_updates_per_s'] > 0
+    assert reports[0]['eta'] >= info['eta']
+    
+    
+def test_memory_sampling():
+    an = network()
+    an.set_sampling(max_dt=2e-3)
+    reports = []
+    progress = Progress(reports.append, interval=0.0)
+    an.solve(inlet, 0.0, 0.0, progress=progress)
+    # the memory follows the time history as it grows
+    assert len(an.times) > an.ntr
+    assert reports[-1]['memory'] == sum([a.U.nbytes + a.P.nbytes
+                                         for a in an.arteries])
+    assert reports[-1]['memory'] > reports[0]['memory']
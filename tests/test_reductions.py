@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+
+from VaMpy.reductions import *
+from VaMpy.artery_network import *
+from VaMpy.examples import *
+import numpy as np
+
+
+eps = 1e-5
+
+
+def test_init():
+    red = Reductions(10, 0.5, 2.0, [1, 2])
+    assert red.t0 == 0.5
+    assert red.T == 2.0
+    assert red.mean.shape == (3, 10)
+    assert red.harmonics.tolist() == [1, 2]
+    
+    
+def test_update():
+    nx = 4
+    T = 1.0
+    red = Reductions(nx, 1.0, T, [1, 2])
+    dt = 1e-3
+    for t in np.arange(dt, 2*T+dt/2, dt):
+        x = np.ones(nx) * (2 + np.sin(2*np.pi*t/T))
+        red.update(t, dt, x, 2*x, 3*x)
+    assert abs(red.mean[0] - 2).max() < eps
+    assert abs(red.mean[2] - 6).max() < eps
+    assert abs(red.var[0] - 0.5).max() < eps
+    assert abs(red.max[1] - 6).max() < eps
+    assert abs(red.pulse[0] - 2).max() < eps
+    assert abs(np.abs(red.dft[0,0]) - 0.5).max() < eps
+    assert abs(red.dft[1]).max() < eps
+    
+    
+def test_network_reductions():
+    an = example_network(2, 20, history=False)
+    an.set_time(0.2, 1e-3, 0.1)
+    an.set_reductions([1])
+    for s in an.iter_solve(lambda t: 0.5 + 0.1*np.sin(20*np.pi*t)):
+        pass
+    for artery in an.arteries:
+        red = artery.reductions
+        assert (red.min <= red.mean).all()
+        assert (red.mean <= red.max).all()
+        assert red.dft.shape == (1, 3, artery.nx)
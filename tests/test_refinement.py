@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+
+from VaMpy.refinement import *
+from VaMpy.artery_network import *
+from VaMpy.examples import *
+import numpy as np
+
+
+def network(nx):
+    return example_network(2, nx)
+    
+    
+def sine_flow(t):
+    return 0.5 + 0.2*np.sin(2*np.pi*t/0.2)
+    
+    
+def test_levels():
+    study = RefinementStudy(network, sine_flow, 0.2, nx=(11, 21, 41),
+                            dt=2e-3)
+    assert study.ratio == 2
+    assert study.dt[-1] == 5e-4
+    try:
+        RefinementStudy(network, sine_flow, 0.2, nx=(11, 21, 31))
+        assert False
+    except ValueError:
+        pass
+        
+        
+def test_run():
+    study = RefinementStudy(network, sine_flow, 0.2, nx=(11, 21, 41),
+                            dt=2e-3, transient=1)
+    Q = study.run(2)
+    assert len(Q) == 3
+    assert Q[0].shape == (3, 2, 3, 3)
+    # mean flow is conserved at the junction of the root artery
+    assert abs(Q[-1][0,0,1,-1] - Q[-1][1,0,1,0] - Q[-1][2,0,1,0]) < 1e-3
+    assert study.differences[-1] < study.differences[0]
+    assert study.order > 0.5
+    assert study.extrapolated.shape == Q[0].shape
+    
+    
+def test_undefined_order():
+    study = RefinementStudy(network, sine_flow, 0.2, nx=(11, 21, 41))
+    # the finest levels agree exactly
+    study._quantities = [np.zeros(3), np.ones(3), np.ones(3)]
+    assert study.order is None
+    assert study.extrapolated is None
+    # the differences grow
+    study._quantities = [np.zeros(3), np.ones(3), 3*np.ones(3)]
+    assert study.order < 0
+    assert study.extrapolated is None
@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+
+from VaMpy.result_cache import *
+from VaMpy.artery_network import *
+from VaMpy.examples import *
+import numpy as np
+import os
+import tempfile
+import shutil
+import time
+
+
+def network():
+    an = example_network(2, 20)
+    an.set_time(0.05, 1e-3)
+    return an
+    
+    
+def inlet(t):
+    return 0.5 + 0.2*np.sin(t)
+    
+    
+def test_key():
+    arteries = {'R': 0.0037, 'a': 0.91}
+    inlet = np.array([0.1, 0.2])
+    key = ResultCache.key({'inlet': 'inlet.csv'}, arteries, inlet, nx=40)
+    assert key == ResultCache.key({'inlet': 'inlet.csv'}, arteries, inlet,
+                                  nx=40)
+    assert key != ResultCache.key({'inlet': 'inlet.csv'}, arteries, inlet,
+                                  nx=41)
+    assert key != ResultCache.key({'inlet': 'inlet.csv'}, arteries, 2*inlet,
+                                  nx=40)
+                                  
+                                  
+def test_solve():
+    cache_dir = tempfile.mkdtemp()
+    try:
+        cache = ResultCache(cache_dir)
+        an = network()
+        assert cache.solve(an, inlet, 0.0, 0.0) == False
+        an2 = network()
+        assert cache.solve(an2, inlet, 0.0, 0.0) == True
+        assert an2.t == an.t
+        assert (an2.times == an.times).all()
+        for a1, a2 in zip(an.arteries, an2.arteries):
+            assert (a1.P == a2.P).all()
+            assert (a1.U0 == a2.U0).all()
+        # any input of the run changes the key
+        an3 = network()
+        an3.set_time(0.05, 5e-4)
+        assert cache.solve(an3, inlet, 0.0, 0.0) == False
+        an4 = network()
+        assert cache.solve(an4, lambda t: inlet(t) + 1e-3, 0.0, 0.0) == False
+        an5 = network()
+        an5.arteries[1].windkessel = (1.0, 2.0, 3.0)
+        assert cache.solve(an5, inlet, 0.0, 0.0) == False
+    finally:
+        shutil.rmtree(cache_dir)
+        
+        
+def bypass(setup):
+    # a cached run does not provide probes, reductions or sensitivities, so
+    # runs using them are always solved
+    cache_dir = tempfile.mkdtemp()
+    try:
+        cache = ResultCache(cache_dir)
+        assert cache.solve(network(), inlet, 0.0, 0.0) == False
+        an = network()
+        check = setup(an)
+        assert cache.solve(an, inlet, 0.0, 0.0) == False
+        check(an)
+        assert len(os.listdir(cache_dir)) == 1
+    finally:
+        shutil.rmtree(cache_dir)
+        
+        
+def test_bypass_probes():
+    def setup(an):
+        probe = an.add_probe(1, 0.1)
+        def check(an):
+            assert len(probe.t) > 0
+        return check
+    bypass(setup)
+    
+    
+def test_bypass_reductions():
+    def setup(an):
+        an.set_reductions()
+        def check(an):
+            assert (an.arteries[0].reductions.max[0] > 0).all()
+        return check
+    bypass(setup)
+    
+    
+def test_bypass_sensitivities():
+    def setup(an):
+        an.set_sensitivities(['R'])
+        def check(an):
+            assert (an.arteries[0].dU0 != 0).any()
+        return check
+    bypass(setup)
+    
+    
+def test_evict():
+    cache_dir = tempfile.mkdtemp()
+    try:
+        cache = ResultCache(cache_dir, max_size=3000)
+        for key in ['a', 'b', 'c']:
+            cache.put(key, {'x': np.zeros(100)})
+            time.sleep(0.01)
+        assert cache.get('a') is None
+        assert cache.get('c') is not None
+    finally:
+        shutil.rmtree(cache_dir)
@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+
+from VaMpy.shooting import *
+from VaMpy.artery_network import *
+from VaMpy.examples import *
+import numpy as np
+
+
+def network(nx, depth=1):
+    return example_network(depth, nx)
+    
+    
+def tree(nx):
+    return network(nx, 2)
+    
+    
+def sine_flow(t):
+    return 0.5 + 0.2*np.sin(2*np.pi*t/0.1)
+    
+    
+def test_pack():
+    ps = PeriodicShooting(network, sine_flow, 0.1, 11, 1e-3)
+    state = get_state(network(11))
+    x = ps.pack(state)
+    assert len(x) == 22
+    assert np.allclose(ps.unpack(x)["U0"], state["U0"])
+    
+    
+def test_solve():
+    ps = PeriodicShooting(network, sine_flow, 0.1, 11, 1e-3, tol=1e-5)
+    state = ps.solve()
+    n = ps.evaluations
+    assert np.max(np.absolute(ps.residual(ps.pack(state)))) < 1e-5
+    assert ps.evaluations == n + 1
+    
+    
+def test_bifurcation():
+    # periodic state of a root artery and its two daughters
+    ps = PeriodicShooting(tree, sine_flow, 0.1, 11, 1e-3, tol=1e-5)
+    assert len(ps.pack(get_state(tree(11)))) == 66
+    state = ps.solve()
+    assert np.max(np.absolute(ps.residual(ps.pack(state)))) < 1e-5
+    # mass is conserved at the junction
+    q = [state["U%d" % (pos)][1] for pos in range(3)]
+    assert abs(q[0][-1] - q[1][0] - q[2][0]) < 1e-6
@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+
+from VaMpy.units import *
+from VaMpy.artery_network import *
+from VaMpy.examples import *
+import numpy as np
+import os
+import matplotlib.pylab as plt
+import tempfile
+import shutil
+
+
+def test_scale():
+    assert scale('a', 'nondim', 1.0, 10.0, 1.06) == (1.0, 0.0)
+    assert np.allclose(scale('q', 'SI', 1.0, 10.0, 1.06), (1e-5, 0.0))
+    s, offset = scale('p', 'mmHg', 1.0, 10.0, 1.06)
+    assert offset == 85.0
+    assert abs(s - 106*760/1.01325e6) < 1e-12
+    s_si, offset_si = scale('p', 'SI', 1.0, 10.0, 1.06)
+    assert abs(offset_si/offset - 133.322) < 1e-3
+    for args in [('a', 'mmHg'), ('u', 'cgs')]:
+        try:
+            scale(args[0], args[1], 1.0, 10.0, 1.06)
+            assert False
+        except ValueError:
+            pass
+            
+            
+def test_view():
+    data = np.arange(12.0).reshape((4, 3))
+    view = ScaledView(data, 2.0, 1.0)
+    assert view.shape == (4, 3)
+    assert view[1,2] == 11.0
+    assert np.allclose(np.asarray(view), 1 + 2*data)
+    chunks = list(view.chunks(3))
+    assert len(chunks) == 2 and chunks[1].shape == (1, 3)
+    # the data is not modified
+    assert data[1,2] == 5.0
+    
+    
+def sine_flow(t):
+    return 0.5 + 0.2*np.sin(t)
+    
+    
+def test_network_results():
+    an = example_network(2, 20)
+    an.set_time(0.05, 1e-3, 0.05)
+    an.solve(sine_flow, 0, 0.05)
+    artery = an.arteries[0]
+    P = artery.P.copy()
+    assert np.allclose(artery.pressure()[:], 85 + P*1.06*100*760/1.01325e6)
+    assert np.allclose(artery.flow('nondim')[:], artery.U[1])
+    data_dir = tempfile.mkdtemp()
+    try:
+        an.dump_results('test', data_dir, 'npy')
+        p = np.load("%s/p0_test.npy" % (data_dir))
+        assert np.allclose(p, artery.pressure()[:])
+        an.dump_results('test', data_dir, units='nondim')
+        p = np.loadtxt("%s/p0_test.csv" % (data_dir), delimiter=',')
+        assert np.allclose(p, P)
+        # plots are written without a display
+        plt.switch_backend('Agg')
+        artery.time_plots('test', data_dir, 2, an.times)
+        assert os.path.exists("%s/test_q0_time.png" % (data_dir))
+    finally:
+        shutil.rmtree(data_dir)
+    assert (artery.P == P).all()
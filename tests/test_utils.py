@@ -1,6 +1,6 @@
 # -*- coding: utf-8 -*-
 
-from pyFDM.utils import *
+from VaMpy.utils import *
 
 
 eps = 1e-5
@@ -68,4 +68,13 @@ def test_periodic():
 def test_extrapolate():
     assert extrapolate(2, [0,1], [0,1]) == 2.0
     assert extrapolate(2, [0,1], [0,4]) == 8.0
-    assert extrapolate(-2, [0,-1], [0,4]) == 8.0
\ No newline at end of file
+    assert extrapolate(-2, [0,-1], [0,4]) == 8.0
+    
+    
+def test_resample():
+    import numpy as np
+    t = np.array([0.0, 1.0, 3.0])
+    y = np.array([[0.0, 1.0], [2.0, 1.0], [2.0, 5.0]])
+    r = resample(t, y, [-1.0, 0.5, 2.0, 3.0, 4.0])
+    assert r.shape == (5, 2)
+    assert np.allclose(r, [[0, 1], [1, 1], [2, 3], [2, 5], [2, 5]])
@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+
+from VaMpy.warm_start import *
+from VaMpy.artery_network import *
+from VaMpy.examples import *
+import numpy as np
+import tempfile
+import shutil
+
+
+def network(R0=0.37, nx=20):
+    return example_network(2, nx, R=R0)
+    
+    
+def test_key():
+    assert StateCache.key(network()) == StateCache.key(network(nx=30))
+    assert StateCache.key(network()) != StateCache.key(network(0.38))
+    
+    
+def test_store_load():
+    cache_dir = tempfile.mkdtemp()
+    try:
+        cache = StateCache(cache_dir)
+        an = network()
+        assert cache.load(an) == False
+        for artery in an.arteries:
+            artery.U0[1,:] = np.linspace(0.2, 0.4, artery.nx)
+        cache.store(an)
+        an = network(nx=39)
+        an.initial_conditions(0.5, cache=cache)
+        for artery in an.arteries:
+            assert abs(artery.U0[1,-1] - 0.4) < 1e-12
+            assert abs(artery.U0[1,19] - 0.3) < 1e-12
+        assert cache.nearest(network(0.38)) == cache.fname(StateCache.key(
+                                                            network()))
+        assert cache.nearest(network(0.5)) is None
+        an = network()
+        for artery in an.arteries:
+            artery.windkessel = (0.1, 0.2, 0.3)
+        assert StateCache.key(an) != StateCache.key(network())
+        assert cache.nearest(an) is None
+    finally:
+        shutil.rmtree(cache_dir)
@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+
+from VaMpy.work_precision import *
+import os
+import tempfile
+import shutil
+import numpy as np
+
+
+REFERENCE = os.path.join(os.path.dirname(__file__), 'data',
+                         'work_precision_bifurcation.npz')
+TREE = os.path.join(os.path.dirname(__file__), 'data',
+                    'work_precision_tree.npz')
+                         
+                         
+def test_reference():
+    ref = load_reference(REFERENCE)
+    assert ref['problem'] == 'bifurcation'
+    assert ref['nx'] == 641
+    assert np.allclose(ref['t'], output_times('bifurcation'))
+    # 3 arteries with 3 probes each
+    assert ref['data'].shape == (100, 3, 9)
+    assert np.all(np.isfinite(ref['data']))
+    
+    
+def test_suite():
+    ref = load_reference(REFERENCE)
+    records = suite(ref, nx=(21, 41), dt=(4e-3, 0.1),
+                    configs=['lax_wendroff'])
+    assert len(records) == 4
+    ok = [r for r in records if r['status'] == 'ok']
+    assert [r['nx'] for r in ok] == [21, 41]
+    assert all(r['status'] == 'unstable' and r['error'] is None
+               for r in records if r['dt'] == 0.1)
+    assert ok[1]['error'] < ok[0]['error'] < 0.05
+    assert ok[0]['cells'] == 63
+    try:
+        suite(ref, nx=(21,), dt=(4e-3,), configs=['euler'])
+        assert False
+    except ValueError:
+        pass
+    # configuration errors of the run are not taken for instabilities
+    CONFIGS['invalid'] = {'scheme': 'lax_wendroff', 'lts': True,
+                          'outlet': 'windkessel'}
+    try:
+        suite(ref, nx=(21,), dt=(4e-3,), configs=['invalid'])
+        assert False
+    except Unstable:
+        assert False
+    except ValueError:
+        pass
+    finally:
+        del CONFIGS['invalid']
+    try:
+        measure('bifurcation', 21, 0.1, t=ref['t'])
+        assert False
+    except Unstable:
+        pass
+        
+        
+def test_lts():
+    ref = load_reference(TREE)
+    assert ref['problem'] == 'tree'
+    # 7 arteries with 3 probes each
+    assert ref['data'].shape == (100, 3, 21)
+    # dt is only stable with substeps in the smaller arteries
+    records = suite(ref, nx=(41,), dt=(4e-3,),
+                    configs=['lax_wendroff', 'lts'])
+    assert [r['status'] for r in records] == ['unstable', 'ok']
+    assert records[1]['error'] < 0.05
+    assert records[1]['cells'] == 287
+    
+    
+def test_pareto():
+    records = [{'status': 'ok', 'wall': 1.0, 'error': 0.1},
+               {'status': 'ok', 'wall': 2.0, 'error': 0.2},
+               {'status': 'ok', 'wall': 3.0, 'error': 0.05},
+               {'status': 'unstable', 'wall': None, 'error': None}]
+    front = pareto(records)
+    assert [r['wall'] for r in front] == [1.0, 3.0]
+    
+    
+def test_regressions():
+    base = [{'problem': 'bifurcation', 'config': 'lax_wendroff', 'nx': 21,
+             'dt': 4e-3, 'status': 'ok', 'error': 0.01}]
+    same = [dict(base[0], error=0.0102)]
+    worse = [dict(base[0], error=0.02)]
+    unstable = [dict(base[0], status='unstable', error=None)]
+    assert regressions(same, base) == []
+    assert len(regressions(worse, base)) == 1
+    assert len(regressions(unstable, base)) == 1
+    # new points are ignored, missing ones are reported
+    assert regressions(same + [dict(base[0], nx=41, error=1.0)], base) == []
+    assert regressions([dict(base[0], nx=41, error=1.0)], base) ==\
+           [(None, base[0])]
+    
+    
+def test_records():
+    data_dir = tempfile.mkdtemp()
+    try:
+        fname = os.path.join(data_dir, 'records.json')
+        records = [{'problem': 'bifurcation', 'config': 'lax_wendroff',
+                    'nx': 21, 'dt': 4e-3, 'status': 'ok', 'wall': 0.5,
+                    'error': 0.01}]
+        write_records(fname, records)
+        assert read_records(fname) == records
+    finally:
+        shutil.rmtree(data_dir)
+        
+        
\ No newline at end of file